@@ -23,6 +23,7 @@ system_message = {
         "You can only use the following tools: fetch_github_issue, get_issue_details, retrieve_context, post_comment.\n"
         "Whenever an issue involves deals with code or codebase, use the `retrieve_context` tool to get the relevant code snippets or metadata about the codebase to formulate your response.\n"
         "STRICTLY READ the context that you get back from `retrieve_context` and use it to inform your response.\n"
+        "The context lists code chunks headed by their file path and line range; refer to files and lines by these headers when pointing to code.\n"
         "If you do not get any relevant context from `retrieve_context` tool then JUST STICK to the context that is provided in the issue description.\n\n"
         "DO NOT OVERUSE the context retrieved from `retrieve_context`, only extract relevant context that exactly matches to the current issue.\n\n"
         "DO NOT OVEREXAGGERATE OR MAKE UP INFORMATION.\n"
@@ -20,7 +20,7 @@ tools = [
         "type": "function",
         "function": {
             "name": "get_issue_details",
-            "description": "Get details of a GitHub issue",
+            "description": "Get the title and body of a GitHub issue",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+from agent.core import StreamDelta, run_agent
+from config import AVAILABLE_MODELS, BATCH_CONCURRENCY
+from tools.code_index import build_repo_index
+from tools.github_tools import fetch_github_issue, list_issues_async
+
+
+async def triage_issue(issue_url: str, branch_name: str, model_type: str, semaphore: asyncio.Semaphore) -> dict:
+    """Run the agent on one issue and return its outcome and usage."""
+    async with semaphore:
+        result = {"issue_url": issue_url, "stats": {}, "error": None, "completed": False}
+        started = time.perf_counter()
+        try:
+            async for log_msg in run_agent(issue_url, branch_name, model_type, stats=result["stats"]):
+                if not isinstance(log_msg, StreamDelta) and str(log_msg).startswith("✅"):
+                    result["completed"] = True
+        except Exception as e:
+            result["error"] = str(e)
+        result["duration"] = time.perf_counter() - started
+        return result
+
+
+def summarize_backlog(results: List[dict], model_type: str, wall_time: float, index_time: float) -> str:
+    """Format throughput, latency, token and cost totals of a backlog run."""
+    durations = sorted(result["duration"] for result in results)
+    prompt_tokens = sum(result["stats"].get("prompt_tokens", 0) for result in results)
+    completion_tokens = sum(result["stats"].get("completion_tokens", 0) for result in results)
+    llm_calls = sum(result["stats"].get("llm_calls", 0) for result in results)
+    tool_calls = sum(result["stats"].get("tool_calls", 0) for result in results)
+    model_config = AVAILABLE_MODELS[model_type]
+    cost = (prompt_tokens * model_config["prompt_price"] + completion_tokens * model_config["completion_price"]) / 1_000_000
+
+    lines = [
+        "📊 Backlog triage summary",
+        f"- Issues: {len(results)} ({sum(r['completed'] for r in results)} commented, {sum(bool(r['error']) for r in results)} failed)",
+        f"- Wall time: {wall_time:.1f}s (index build {index_time:.1f}s)",
+        f"- Throughput: {len(results) / wall_time * 60 if wall_time else 0:.1f} issues/min",
+    ]
+    if durations:
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        lines.append(f"- Latency per issue: avg {sum(durations) / len(durations):.1f}s, p95 {p95:.1f}s")
+    lines.append(f"- LLM calls: {llm_calls}, tool calls: {tool_calls}")
+    lines.append(f"- Tokens: {prompt_tokens} prompt + {completion_tokens} completion")
+    if cost:
+        lines.append(f"- Estimated cost: ${cost:.4f}")
+    return "\n".join(lines)
+
+
+async def run_backlog(owner: str, repo: str, branch_name: str = "main", labels: Optional[List[str]] = None, issue_urls: Optional[List[str]] = None, model_type: str = "mistral", concurrency: int = BATCH_CONCURRENCY):
+    """
+    Triage many issues of one repository, sharing a single code index.
+
+    Issues are the given URLs, or every open issue of the repo (optionally filtered by labels).
+    The index is built once for the commit `branch_name` points at; each agent run then reuses
+    it from memory instead of fetching and embedding the repository again.
+    Yields progress messages and, finally, a throughput and cost summary.
+    """
+    started = time.perf_counter()
+
+    if issue_urls:
+        for issue_url in issue_urls:
+            issue_owner, issue_repo, _ = fetch_github_issue(issue_url)
+            if (issue_owner.lower(), issue_repo.lower()) != (owner.lower(), repo.lower()):
+                raise ValueError(f"Issue {issue_url} does not belong to {owner}/{repo}")
+    else:
+        issues = await list_issues_async(owner, repo, labels=labels)
+        issue_urls = [issue["html_url"] for issue in issues]
+    yield f"📋 Triaging {len(issue_urls)} issues of {owner}/{repo} with {AVAILABLE_MODELS[model_type]['name']}..."
+
+    await build_repo_index(owner, repo, branch_name, model_type=model_type)
+    index_time = time.perf_counter() - started
+    yield f"🗂️ Code index ready for {owner}/{repo}@{branch_name} in {index_time:.1f}s."
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(triage_issue(url, branch_name, model_type, semaphore)) for url in issue_urls]
+    results = []
+    try:
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            results.append(result)
+            status = f"failed: {result['error']}" if result["error"] else ("commented" if result["completed"] else "finished")
+            yield f"[{len(results)}/{len(tasks)}] {result['issue_url']} {status} in {result['duration']:.1f}s"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield summarize_backlog(results, model_type, time.perf_counter() - started, index_time)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Triage a backlog of GitHub issues with IssueWiz.")
+    parser.add_argument("repository", help="owner/repo")
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--label", action="append", dest="labels", help="Only open issues with this label (repeatable)")
+    parser.add_argument("--issue", action="append", dest="issue_urls", help="Issue URL to triage (repeatable)")
+    parser.add_argument("--model", default="mistral", choices=list(AVAILABLE_MODELS))
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args()
+
+    owner, repo = args.repository.split("/", 1)
+    async for message in run_backlog(owner, repo, args.branch, args.labels, args.issue_urls, args.model, args.concurrency):
+        print(message)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+import json
+import threading
+from typing import Any, List
+from config import AGENT_CONTEXT_TOKEN_BUDGET, COMPACTED_TOOL_RESULT_TOKENS, TOOL_RESULT_MAX_TOKENS
+
+# Average characters per token, used when no tokenizer is available for the provider.
+CHARS_PER_TOKEN = {"openai": 4.0, "mistral": 3.5}
+# Role, separators and other per-message framing the providers add to the prompt.
+MESSAGE_OVERHEAD_TOKENS = 4
+COMPACTED_MARKER = "[Compacted]"
+
+encoders = {}
+encoders_lock = threading.Lock()
+
+
+def get_encoder(model_type: str, model: str):
+    """tiktoken encoder for OpenAI models, or None to fall back to a character estimate."""
+    if model_type != "openai":
+        return None
+    with encoders_lock:
+        if model not in encoders:
+            try:
+                import tiktoken
+                try:
+                    encoders[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoders[model] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"[Warning] No tokenizer available for {model}, estimating token counts: {e}")
+                encoders[model] = None
+        return encoders[model]
+
+
+def count_tokens(text: str, model_type: str, model: str) -> int:
+    if not text:
+        return 0
+    encoder = get_encoder(model_type, model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return int(len(text) / CHARS_PER_TOKEN.get(model_type, 4.0)) + 1
+
+
+def message_tokens(message: dict, model_type: str, model: str) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "", model_type, model)
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call["function"]
+        tokens += count_tokens(function["name"], model_type, model) + count_tokens(function["arguments"] or "", model_type, model)
+    return tokens
+
+
+def conversation_tokens(messages: List[dict], model_type: str, model: str) -> int:
+    return sum(message_tokens(message, model_type, model) for message in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model_type: str, model: str, note: str = "truncated") -> str:
+    """Keep the beginning of `text` within `max_tokens`, marking how much was cut."""
+    total = count_tokens(text, model_type, model)
+    if total <= max_tokens:
+        return text
+    encoder = get_encoder(model_type, model)
+    if encoder is not None:
+        head = encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        head = text[:int(max_tokens * CHARS_PER_TOKEN.get(model_type, 4.0))]
+    return f"{head.rstrip()}\n... [{note}: {total - max_tokens} of {total} tokens omitted]"
+
+
+def compact_comment(comment: dict) -> dict:
+    """The parts of a created GitHub comment the agent needs; the API returns dozens of fields."""
+    return {"posted": True, "id": comment.get("id"), "html_url": comment.get("html_url")}
+
+
+tool_result_compactors = {
+    "post_comment": compact_comment,
+}
+
+
+def drop_empty(value: Any) -> Any:
+    """Remove None, empty strings and empty containers from nested JSON data."""
+    if isinstance(value, dict):
+        cleaned = {key: drop_empty(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [drop_empty(item) for item in value]
+    return value
+
+
+def serialize_tool_result(name: str, result: Any, model_type: str, model: str) -> str:
+    """Compact text for a tool result: minimal JSON for structured results, capped at TOOL_RESULT_MAX_TOKENS."""
+    compactor = tool_result_compactors.get(name)
+    if compactor is not None and isinstance(result, dict):
+        result = compactor(result)
+    if isinstance(result, (dict, list)):
+        text = json.dumps(drop_empty(result), separators=(",", ":"), ensure_ascii=False, default=str)
+    else:
+        text = str(result)
+    return truncate_to_tokens(text, TOOL_RESULT_MAX_TOKENS, model_type, model)
+
+
+def compact_messages(messages: List[dict], model_type: str, model: str, budget: int = AGENT_CONTEXT_TOKEN_BUDGET) -> int:
+    """
+    Keep the conversation within `budget` tokens by shortening tool results in place,
+    oldest first, to COMPACTED_TOOL_RESULT_TOKENS each. Results of the latest step are only
+    shortened when older ones do not free enough. Returns the conversation size in tokens.
+    """
+    total = conversation_tokens(messages, model_type, model)
+    if total <= budget:
+        return total
+
+    tool_messages = [
+        message for message in messages
+        if message.get("role") == "tool" and not (message.get("content") or "").startswith(COMPACTED_MARKER)
+    ]
+    last_assistant = max((i for i, message in enumerate(messages) if message.get("role") == "assistant"), default=-1)
+    latest = [message for message in messages[last_assistant + 1:] if message in tool_messages]
+    older = [message for message in tool_messages if message not in latest]
+
+    compacted = 0
+    for message in older + latest:
+        if total <= budget:
+            break
+        before = message_tokens(message, model_type, model)
+        content = truncate_to_tokens(message["content"], COMPACTED_TOOL_RESULT_TOKENS, model_type, model, note="compacted to fit the context budget")
+        message["content"] = f"{COMPACTED_MARKER} {content}"
+        total -= before - message_tokens(message, model_type, model)
+        compacted += 1
+
+    print(f"[Agent] Compacted {compacted} tool results, conversation now ~{total} tokens (budget {budget}).")
+    return total
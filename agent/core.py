@@ -1,18 +1,27 @@
+import asyncio
 import json
-from mistralai import Mistral
-from openai import OpenAI
+import time
 from agent.agent_config import prompts
 from agent.agent_config import tool_schema
+from agent.context import compact_messages, serialize_tool_result
+from agent.executor import call_tool, execute_tool_calls
 from config import AVAILABLE_MODELS
-from tools.code_index import retrieve_context
-from tools.github_tools import fetch_github_issue, get_issue_details, post_comment
+from tools.github_tools import fetch_github_issue, get_issue_details_async, post_comment_async
+from tools.model_cache import lookup, record, request_key
+from tools.model_clients import shared_client
+from tools.tracing import RunTrace, record_span
+
+async def retrieve_context(owner: str, repo: str, ref: str, issue_description: str, model_type: str = "mistral") -> str:
+    """Tool entry point; LlamaIndex and NumPy behind tools.code_index are only imported on first use."""
+    from tools.code_index import retrieve_context as retrieve_repo_context
+    return await retrieve_repo_context(owner, repo, ref, issue_description, model_type)
 
 tools = tool_schema.tools
 names_to_functions = {
     "fetch_github_issue": fetch_github_issue,
-    "get_issue_details": get_issue_details,
+    "get_issue_details": get_issue_details_async,
     "retrieve_context": retrieve_context,
-    "post_comment": post_comment,
+    "post_comment": post_comment_async,
 }
 
 allowed_tools = set(names_to_functions.keys())
@@ -20,22 +29,156 @@ allowed_tools = set(names_to_functions.keys())
 system_message = prompts.system_message
 
 def get_model_client(model_type):
-    """Get the appropriate client based on the model type."""
+    """Get the shared chat client for the model type; must be called from the event loop that uses it."""
     model_config = AVAILABLE_MODELS.get(model_type)
     if not model_config or not model_config["api_key"]:
         raise ValueError(f"Invalid model type or missing API key for {model_type}")
     
+    # Provider SDKs are imported on first use to keep startup fast.
     if model_type == "mistral":
-        return Mistral(api_key=model_config["api_key"]), model_config["model"]
+        from mistralai import Mistral
+        factory = lambda: Mistral(api_key=model_config["api_key"])
     elif model_type == "openai":
-        return OpenAI(api_key=model_config["api_key"]), model_config["model"]
+        from openai import AsyncOpenAI
+        factory = lambda: AsyncOpenAI(api_key=model_config["api_key"])
     else:
         raise ValueError(f"Unsupported model type: {model_type}")
 
-async def run_agent(issue_url: str, branch_name: str = "main", model_type: str = "mistral"):
+    # One client per provider, model and key on each event loop, so runs share its connection pool.
+    client = shared_client("chat", model_type, model_config["model"], model_config["api_key"], factory, per_loop=True)
+    return client, model_config["model"]
+
+class StreamDelta:
+    """A partial completion forwarded by run_agent while the model is still streaming."""
+
+    def __init__(self, kind: str, text: str, tool_name: str = None):
+        self.kind = kind  # "content" or "tool_call"
+        self.text = text
+        self.tool_name = tool_name
+
+    def __str__(self):
+        return self.text
+
+def delta_text(content) -> str:
+    """Text of a streamed content delta, which Mistral may send as a list of chunks."""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(chunk, "text", "") or "" for chunk in content)
+
+async def stream_completion(client, model_type: str, model: str, messages: list, message: dict, usage: dict = None):
+    """
+    Stream one chat completion, replaying a recorded response when the model cache has one.
+    Yields StreamDelta objects as content and tool-call arguments arrive, and assembles the
+    final assistant message (content and tool_calls) into `message`. Token usage reported
+    by the provider is added to `usage` when given; replayed completions use no tokens.
+    """
+    key = request_key("chat", provider=model_type, model=model, messages=messages, tools=tools)
+    recorded = await asyncio.to_thread(lookup, key, "chat")
+    if recorded is not None:
+        for kind, text, tool_name in recorded["deltas"]:
+            yield StreamDelta(kind, text, tool_name)
+        message["content"] = recorded["content"]
+        if recorded.get("tool_calls"):
+            message["tool_calls"] = recorded["tool_calls"]
+        return
+
+    deltas = []
+    async for delta in stream_provider_completion(client, model_type, model, messages, message, usage):
+        deltas.append((delta.kind, delta.text, delta.tool_name))
+        yield delta
+    await asyncio.to_thread(record, key, "chat", {
+        "content": message["content"], "tool_calls": message.get("tool_calls"), "deltas": deltas,
+    })
+
+async def stream_provider_completion(client, model_type: str, model: str, messages: list, message: dict, usage: dict = None):
+    """Stream one chat completion with the provider's async client (see stream_completion)."""
+    if model_type == "mistral":
+        stream = await client.chat.stream_async(
+            model=model,
+            messages=messages,
+            tools=tools,
+            tool_choice="any",
+        )
+    elif model_type == "openai":
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+    content = []
+    tool_calls = {}
+
+    async for chunk in stream:
+        if model_type == "mistral":
+            chunk = chunk.data
+        if usage is not None and getattr(chunk, "usage", None):
+            usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (chunk.usage.prompt_tokens or 0)
+            usage["completion_tokens"] = usage.get("completion_tokens", 0) + (chunk.usage.completion_tokens or 0)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        text = delta_text(delta.content)
+        if text:
+            content.append(text)
+            yield StreamDelta("content", text)
+
+        for position, tool_call_delta in enumerate(delta.tool_calls or []):
+            if model_type == "openai":
+                index = tool_call_delta.index if tool_call_delta.index is not None else position
+            else:
+                # Mistral sends each tool call whole, and its index is not reliable across calls.
+                index = tool_call_delta.id or len(tool_calls)
+            tool_call = tool_calls.setdefault(
+                index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+            )
+            if tool_call_delta.id:
+                tool_call["id"] = tool_call_delta.id
+            function = tool_call_delta.function
+            if function is None:
+                continue
+            if function.name:
+                tool_call["function"]["name"] = function.name
+            arguments = function.arguments
+            if isinstance(arguments, dict):
+                arguments = json.dumps(arguments)
+            if arguments:
+                tool_call["function"]["arguments"] += arguments
+                yield StreamDelta("tool_call", arguments, tool_call["function"]["name"])
+
+    message["content"] = "".join(content)
+    if tool_calls:
+        message["tool_calls"] = list(tool_calls.values())
+
+async def run_agent(issue_url: str, branch_name: str = "main", model_type: str = "mistral", stats: dict = None):
     """
     Run the agent workflow on a given GitHub issue URL.
+    When `stats` is given it is updated with LLM calls, token usage and tool calls of the run.
+    Ends with a summary of the time, tokens and requests spent per stage.
+    Cancelling the consuming task (or closing the generator) also stops GitHub fetches and
+    embedding batches of the run that are still running in worker threads.
     """
+    if stats is None:
+        stats = {}
+    trace = RunTrace(issue_url=issue_url, model_type=model_type)
+    try:
+        async for message in run_agent_steps(issue_url, branch_name, model_type, stats, trace):
+            yield message
+    except (asyncio.CancelledError, GeneratorExit):
+        trace.cancel()
+        trace.finish("cancelled")
+        print(f"[Agent] Run for {issue_url} cancelled.")
+        raise
+
+async def run_agent_steps(issue_url: str, branch_name: str, model_type: str, stats: dict, trace: RunTrace):
     MAX_STEPS = 5
     tool_calls = 0
     issue_description_cache = None
@@ -51,76 +194,110 @@ async def run_agent(issue_url: str, branch_name: str = "main", model_type: str =
     yield f"⚡️ IssueWiz agent started using {AVAILABLE_MODELS[model_type]['name']}..."
 
     while True:
-        if model_type == "mistral":
-            response = client.chat.complete(
-                model=model,
-                messages=messages,
-                tools=tools,
-                tool_choice="any",
-            )
-            msg = response.choices[0].message
-        elif model_type == "openai":
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
+        msg = {"role": "assistant", "content": ""}
+        # Old tool outputs are shortened first, so the prompt stays bounded across steps.
+        context_tokens = compact_messages(messages, model_type, model)
+        prompt_tokens, completion_tokens = stats.get("prompt_tokens", 0), stats.get("completion_tokens", 0)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async for delta in stream_completion(client, model_type, model, messages, msg, stats):
+                yield delta
+            status = "ok"
+        finally:
+            # Recorded directly: a span context cannot stay open across the yields of this generator.
+            record_span(
+                "llm.completion", time.perf_counter() - started, status, trace=trace, model=model,
+                prompt_tokens=stats.get("prompt_tokens", 0) - prompt_tokens,
+                completion_tokens=stats.get("completion_tokens", 0) - completion_tokens,
+                messages=len(messages), context_tokens=context_tokens,
             )
-            msg = response.choices[0].message
+        stats["llm_calls"] = stats.get("llm_calls", 0) + 1
 
         messages.append(msg)
 
-        if hasattr(msg, "tool_calls") and msg.tool_calls:
-            for tool_call in msg.tool_calls:
-                function_name = tool_call.function.name
-                function_params = json.loads(tool_call.function.arguments)
+        if msg.get("tool_calls"):
+            results = []
+            pending = []
+            for tool_call in msg["tool_calls"]:
+                function_name = tool_call["function"]["name"]
+                function_params = json.loads(tool_call["function"]["arguments"] or "{}")
                 if function_name in allowed_tools:
                     yield f"🔧 Agent is calling tool: `{function_name}`"
-                    function_result = names_to_functions[function_name](**function_params)
+                    if (
+                        function_name == "retrieve_context"
+                        and issue_description_cache
+                        and function_params.get("issue_description") != issue_description_cache
+                    ):
+                        # Correct the description before calling, so retrieval runs once with the right text.
+                        yield "⚠️ Overriding incorrect issue_description with correct one from cache."
+                        function_params["issue_description"] = issue_description_cache
+                    pending.append((len(results), function_name, function_params))
+                    results.append(None)
                     tool_calls += 1
-
-                    if function_name == "get_issue_details" and isinstance(function_result, dict):
-                        issue_title = function_result.get("title")
-                        issue_body = function_result.get("body")
-                        issue_description_cache = issue_title + "\n" + issue_body if issue_title or issue_body else None
-                        yield "📝 Issue description cached."
-
-                    if function_name == "retrieve_context":
-                        if "issue_description" in function_params:
-                            if (
-                                issue_description_cache
-                                and (function_params["issue_description"] != issue_description_cache)
-                            ):
-                                yield "⚠️ Overriding incorrect issue_description with correct one from cache."
-                                function_params["issue_description"] = issue_description_cache
-                                function_result = names_to_functions[function_name](**function_params)
-
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(function_result)
-                    })
-
-                    if function_name == "post_comment":
-                        yield "✅ Comment posted. Task complete."
-                        return
-
+                    stats["tool_calls"] = stats.get("tool_calls", 0) + 1
                 else:
                     yield f"Agent tried to call unknown tool: {function_name}"
-                    tool_error_msg = (
+                    results.append(
                         f"Error: Tool '{function_name}' is not available. "
                         "You can only use the following tools: fetch_github_issue, get_issue_details, post_comment."
                     )
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": tool_error_msg
-                    })
+
+            # Independent calls of one step run concurrently; results are stored back in call order.
+            outcomes = await execute_tool_calls(
+                [(name, names_to_functions[name], params) for _, name, params in pending], trace
+            )
+            comment_posted = False
+            for (position, function_name, function_params), function_result in zip(pending, outcomes):
+                if isinstance(function_result, BaseException):
+                    yield f"⚠️ Tool `{function_name}` failed: {function_result}"
+                    results[position] = f"Error: {function_result}"
+                    continue
+
+                if function_name == "get_issue_details" and isinstance(function_result, dict):
+                    issue_title = function_result.get("title") or ""
+                    issue_body = function_result.get("body") or ""
+                    issue_description_cache = issue_title + "\n" + issue_body if issue_title or issue_body else None
+                    yield "📝 Issue description cached."
+
+                # The issue may only have been fetched by a concurrent call of this step; the
+                # re-run then reuses the in-memory index built by the first call.
+                if function_name == "retrieve_context":
+                    if "issue_description" in function_params:
+                        if (
+                            issue_description_cache
+                            and (function_params["issue_description"] != issue_description_cache)
+                        ):
+                            yield "⚠️ Overriding incorrect issue_description with correct one from cache."
+                            function_params["issue_description"] = issue_description_cache
+                            try:
+                                function_result = await call_tool(function_name, names_to_functions[function_name], function_params, trace)
+                            except Exception as e:
+                                yield f"⚠️ Tool `{function_name}` failed: {e}"
+                                function_result = f"Error: {e}"
+
+                if function_name == "post_comment":
+                    comment_posted = True
+                results[position] = function_result
+
+            for tool_call, function_result in zip(msg["tool_calls"], results):
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": serialize_tool_result(tool_call["function"]["name"], function_result, model_type, model)
+                })
+
+            if comment_posted:
+                yield "✅ Comment posted. Task complete."
+                yield trace.finish()
+                return
+
             if tool_calls >= MAX_STEPS:
                 yield f"Agent stopped after {MAX_STEPS} tool calls to protect against rate limiting."
                 break
         else:
-            yield f"IssueWiz (final): {msg.content}"
+            yield f"IssueWiz (final): {msg['content']}"
             break
 
-    yield "Task Completed"
\ No newline at end of file
+    yield "Task Completed"
+    yield trace.finish()
\ No newline at end of file
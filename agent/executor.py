@@ -0,0 +1,46 @@
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import RETRIEVE_CONTEXT_TIMEOUT, TOOL_TIMEOUT
+from tools.tracing import RunTrace, current_trace, span
+
+# Per-tool timeouts in seconds; tools not listed use TOOL_TIMEOUT.
+tool_timeouts = {
+    "retrieve_context": RETRIEVE_CONTEXT_TIMEOUT,
+}
+
+
+class ToolTimeoutError(Exception):
+    pass
+
+
+async def call_tool(name: str, function: Callable, params: Dict[str, Any], trace: Optional[RunTrace] = None) -> Any:
+    """
+    Call a sync or async tool with its timeout, as a "tool.call" span of `trace`.
+    Sync tools run in a worker thread so they never block the event loop.
+    """
+    async def traced_call():
+        # wait_for runs this in its own task, so the trace only applies to this call.
+        if trace is not None:
+            current_trace.set(trace)
+        with span("tool.call", tool=name):
+            if inspect.iscoroutinefunction(function):
+                return await function(**params)
+            return await asyncio.to_thread(function, **params)
+
+    timeout = tool_timeouts.get(name, TOOL_TIMEOUT)
+    try:
+        return await asyncio.wait_for(traced_call(), timeout)
+    except asyncio.TimeoutError:
+        raise ToolTimeoutError(f"Tool '{name}' timed out after {timeout} seconds")
+
+
+async def execute_tool_calls(calls: List[Tuple[str, Callable, Dict[str, Any]]], trace: Optional[RunTrace] = None) -> List[Any]:
+    """
+    Run the independent tool calls of one agent step concurrently.
+    Returns results in the order of `calls`; a failed call yields its exception instead of a result.
+    """
+    return await asyncio.gather(
+        *(call_tool(name, function, params, trace) for name, function, params in calls),
+        return_exceptions=True,
+    )
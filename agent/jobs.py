@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from agent.core import StreamDelta, run_agent
+from config import JOB_LEASE_SECONDS, JOB_QUEUE_PATH, WEBHOOK_PER_REPO_CONCURRENCY, WEBHOOK_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Durable SQLite queue of agent jobs.
+
+    A delivery ID is only ever queued once, and an issue that already has a queued or running
+    job is not queued again. Running jobs hold a lease that their worker renews; jobs whose
+    lease expired, because the process running them died, are queued again.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, delivery_id TEXT UNIQUE, "
+            "owner TEXT NOT NULL, repo TEXT NOT NULL, issue_num TEXT NOT NULL, issue_url TEXT NOT NULL, "
+            "branch TEXT NOT NULL, model_type TEXT NOT NULL, status TEXT NOT NULL, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self.connection.commit()
+        self.requeue_expired()
+
+    def requeue_expired(self) -> int:
+        """Queue running jobs again whose lease was not renewed for lease_seconds. Returns how many."""
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, now - self.lease_seconds),
+            )
+            self.connection.commit()
+        if cursor.rowcount:
+            logger.warning("Re-queued %d jobs whose lease expired", cursor.rowcount)
+        return cursor.rowcount
+
+    def renew_lease(self, job_id: int):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+            )
+            self.connection.commit()
+
+    def enqueue(self, delivery_id: str, owner: str, repo: str, issue_num: str, issue_url: str, branch: str, model_type: str) -> Optional[int]:
+        """Queue a job. Returns its ID, or None if the delivery or an active job for the issue already exists."""
+        now = time.time()
+        with self.lock:
+            active = self.connection.execute(
+                "SELECT id FROM jobs WHERE owner = ? AND repo = ? AND issue_num = ? AND status IN ('queued', 'running')",
+                (owner, repo, issue_num),
+            ).fetchone()
+            if active is not None:
+                return None
+            try:
+                cursor = self.connection.execute(
+                    "INSERT INTO jobs (delivery_id, owner, repo, issue_num, issue_url, branch, model_type, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (delivery_id, owner, repo, issue_num, issue_url, branch, model_type, now, now),
+                )
+            except sqlite3.IntegrityError:
+                return None
+            self.connection.commit()
+            return cursor.lastrowid
+
+    def claim(self, busy_repos: Dict[str, int], per_repo_limit: int) -> Optional[sqlite3.Row]:
+        """
+        Mark the oldest queued job of a repo below its concurrency cap as running and return it.
+        The update only succeeds while the job is still queued, so two processes sharing the
+        database never claim the same job.
+        """
+        self.requeue_expired()
+        saturated = [repo for repo, running in busy_repos.items() if running >= per_repo_limit]
+        placeholders = ",".join("?" * len(saturated))
+        query = "SELECT * FROM jobs WHERE status = 'queued'"
+        if saturated:
+            query += f" AND (owner || '/' || repo) NOT IN ({placeholders})"
+        query += " ORDER BY id LIMIT 1"
+
+        with self.lock:
+            while True:
+                job = self.connection.execute(query, saturated).fetchone()
+                if job is None:
+                    return None
+                cursor = self.connection.execute(
+                    "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                    (time.time(), job["id"]),
+                )
+                self.connection.commit()
+                if cursor.rowcount:
+                    return job
+
+    def finish(self, job_id: int, error: Optional[str] = None):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                ("failed" if error else "done", error, time.time(), job_id),
+            )
+            self.connection.commit()
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobWorkerPool:
+    """Pool of async workers draining a JobQueue into run_agent, with a per-repo concurrency cap."""
+
+    def __init__(self, queue: JobQueue, num_workers: int = WEBHOOK_WORKERS, per_repo_limit: int = WEBHOOK_PER_REPO_CONCURRENCY, poll_interval: float = 5.0):
+        self.queue = queue
+        self.num_workers = num_workers
+        self.per_repo_limit = per_repo_limit
+        self.poll_interval = poll_interval
+        self.running_repos = Counter()
+        self.wakeup = None
+        self.claim_lock = None
+        self.tasks = []
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.claim_lock = asyncio.Lock()
+        self.tasks = [asyncio.create_task(self.worker(i)) for i in range(self.num_workers)]
+        logger.info("Started %d webhook workers (max %d per repo)", self.num_workers, self.per_repo_limit)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job was queued."""
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def renew_lease(self, job_id: int):
+        """Renew a running job's lease until cancelled, so other processes do not re-queue it."""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            await asyncio.to_thread(self.queue.renew_lease, job_id)
+
+    async def worker(self, worker_id: int):
+        while True:
+            # Claims are serialized and counted under claim_lock, so the per-repo counts cannot race.
+            async with self.claim_lock:
+                job = await asyncio.to_thread(self.queue.claim, dict(self.running_repos), self.per_repo_limit)
+                if job is not None:
+                    repo_key = f"{job['owner']}/{job['repo']}"
+                    self.running_repos[repo_key] += 1
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info("[Worker %d] Processing %s", worker_id, job["issue_url"])
+            error = None
+            lease = asyncio.create_task(self.renew_lease(job["id"]))
+            try:
+                async for log_msg in run_agent(job["issue_url"], job["branch"], job["model_type"]):
+                    if not isinstance(log_msg, StreamDelta):
+                        logger.info("[Worker %d] %s", worker_id, log_msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[Worker %d] Job %s failed: %s", worker_id, job["id"], e)
+                error = str(e)
+            finally:
+                lease.cancel()
+                self.running_repos[repo_key] -= 1
+                if self.running_repos[repo_key] <= 0:
+                    del self.running_repos[repo_key]
+
+            await asyncio.to_thread(self.queue.finish, job["id"], error)
+            # A finished job may unblock a queued job of the same repo.
+            self.notify()
@@ -1,20 +1,42 @@
+import time
 import gradio as gr
-from agent.core import run_agent
+from agent.core import StreamDelta, run_agent
 from config import AVAILABLE_MODELS
 
+def format_progress(logs: list, now: float, running: bool) -> str:
+    """Progress messages with the time spent in each stage; the last stage is still running while `running`."""
+    lines = []
+    for position, (log, started) in enumerate(logs):
+        ended = logs[position + 1][1] if position + 1 < len(logs) else now
+        timing = "running" if running and position == len(logs) - 1 else f"{ended - started:.1f}s"
+        first, _, rest = log.partition("\n")
+        lines.append(f"- {first} _({timing})_")
+        lines.extend(f"  {line}" for line in rest.splitlines())
+    return "\n".join(lines)
+
 async def respond_to_issue(issue_url, branch_name, model_type):
+    """
+    Stream the agent's progress into the chat panel as it happens. Stopping the event in the UI
+    cancels this task, which also cancels the agent run and its in-flight work.
+    """
     logs = []
+    started = time.perf_counter()
     async for log_msg in run_agent(issue_url, branch_name, model_type):
-        logs.append(str(log_msg))
+        if isinstance(log_msg, StreamDelta):
+            continue
+        now = time.perf_counter()
+        logs.append((str(log_msg), now))
+        progress = format_progress(logs, now, running=True)
+        yield [{"role": "assistant", "content": f"⏳ Working on the issue ({now - started:.1f}s)...\n\n{progress}"}]
 
+    now = time.perf_counter()
     collapsible_logs = "<details><summary>Click to view agent's used tool logs</summary>\n\n"
-    for log in logs:
-        collapsible_logs += f"- {log}\n"
-    collapsible_logs += "</details>\n\n"
+    collapsible_logs += format_progress(logs, now, running=False)
+    collapsible_logs += "\n</details>\n\n"
 
-    final_message = f"{collapsible_logs} Agent has successfully processed the issue and posted an update in the comments. Check the GitHub issue for updates."
+    final_message = f"{collapsible_logs} Agent has successfully processed the issue in {now - started:.1f}s and posted an update in the comments. Check the GitHub issue for updates."
 
-    return [{"role": "assistant", "content": final_message}]
+    yield [{"role": "assistant", "content": final_message}]
 
 theme = gr.themes.Soft(
     primary_hue="orange",
@@ -52,6 +74,7 @@ with gr.Blocks(title="IssueWiz – AI Maintainer Agent", theme=theme) as demo:
                 info="Select which AI model to use for processing the issue"
             )
             submit_btn = gr.Button("🚀 Run Agent", variant="primary")
+            stop_btn = gr.Button("⏹ Stop", variant="stop")
 
         with gr.Column(scale=1):
             chatbot = gr.Chatbot(
@@ -66,12 +89,13 @@ with gr.Blocks(title="IssueWiz – AI Maintainer Agent", theme=theme) as demo:
                 max_height=400
             )
 
-        submit_btn.click(
+        run_event = submit_btn.click(
             fn=respond_to_issue,
             inputs=[issue_url, branch_name, model_type],
             outputs=chatbot,
             queue=True,
         )
+        stop_btn.click(fn=None, cancels=[run_event])
 
     gr.Markdown("""       
     ---
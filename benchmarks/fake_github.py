@@ -0,0 +1,233 @@
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+WORDS = [
+    "auth", "token", "session", "cache", "config", "parser", "render", "upload", "download", "queue",
+    "worker", "schema", "export", "import", "payment", "invoice", "user", "account", "search", "index",
+    "report", "metric", "event", "webhook", "retry", "timeout", "storage", "bucket", "image", "thumbnail",
+]
+
+
+class SyntheticRepo:
+    """
+    A deterministic synthetic repository: `num_files` source files spread over nested packages,
+    a few docs, a README and `num_issues` issues that each point at a function in one file.
+    """
+
+    def __init__(self, owner: str = "bench", name: str = "repo", num_files: int = 1000, num_issues: int = 20, seed: int = 0):
+        self.owner = owner
+        self.name = name
+        self.commit_sha = hashlib.sha1(f"{owner}/{name}/{num_files}/{seed}".encode()).hexdigest()
+        rng = random.Random(seed)
+        self.files: Dict[str, str] = {"README.md": f"# {name}\n\nSynthetic repository with {num_files} files for benchmarks.\n"}
+        self.symbols: List[tuple] = []
+        for i in range(num_files):
+            if i % 20 == 19:
+                self.files[f"docs/{rng.choice(WORDS)}_{i}.md"] = f"# {rng.choice(WORDS).title()} guide\n\n" + " ".join(rng.choices(WORDS, k=80)) + "\n"
+                continue
+            package = f"src/{WORDS[i % len(WORDS)]}/{rng.choice(WORDS)}_{i // len(WORDS) % 50}"
+            first, second = rng.sample(WORDS, 2)
+            path = f"{package}/{first}_{second}_{i}.py"
+            self.files[path] = self.source_file(first, second, i)
+            self.symbols.append((path, f"{first}_{second}_handler_{i}"))
+
+        self.issues = []
+        for number in range(1, num_issues + 1):
+            path, symbol = self.symbols[(number * 7919) % len(self.symbols)] if self.symbols else ("README.md", "main")
+            self.issues.append({
+                "number": number,
+                "title": f"{symbol} raises ValueError on empty input",
+                "body": (
+                    f"Calling `{symbol}` with an empty payload crashes instead of returning None.\n\n"
+                    "Traceback (most recent call last):\n"
+                    f'  File "/app/{path}", line 12, in {symbol}\n'
+                    "ValueError: empty payload\n"
+                ),
+                "html_url": f"https://github.com/{owner}/{name}/issues/{number}",
+                "state": "open",
+                "labels": [{"name": "bug"}],
+            })
+        self._tree = None
+        self._tarball = None
+        self._tarball_lock = threading.Lock()
+
+    @staticmethod
+    def source_file(first: str, second: str, i: int) -> str:
+        return (
+            f'"""{first.title()} {second} helpers."""\n'
+            "import logging\n\n"
+            "logger = logging.getLogger(__name__)\n\n\n"
+            f"class {first.title()}{second.title()}Error(Exception):\n"
+            "    pass\n\n\n"
+            f"def {first}_{second}_handler_{i}(payload):\n"
+            f'    """Handle a {first} {second} payload."""\n'
+            "    if not payload:\n"
+            f'        raise ValueError("empty payload")\n'
+            f"    logger.debug('{first} %s', payload)\n"
+            f"    return {{'{first}': payload.get('{second}'), 'id': {i}}}\n\n\n"
+            f"def validate_{first}_{i}(value):\n"
+            f"    return isinstance(value, dict) and '{second}' in value\n"
+        )
+
+    def tree(self) -> dict:
+        """Recursive git tree listing with one blob per file."""
+        if self._tree is None:
+            entries = [{"path": path, "type": "blob", "sha": hashlib.sha1(content.encode()).hexdigest()} for path, content in self.files.items()]
+            self._tree = {"sha": self.commit_sha, "tree": entries, "truncated": False}
+        return self._tree
+
+    def tarball(self) -> bytes:
+        """Gzipped archive in GitHub's layout, built once on first request."""
+        with self._tarball_lock:
+            if self._tarball is None:
+                buffer = io.BytesIO()
+                with tarfile.open(fileobj=buffer, mode="w:gz", compresslevel=1) as archive:
+                    prefix = f"{self.owner}-{self.name}-{self.commit_sha[:7]}/"
+                    for path, content in self.files.items():
+                        data = content.encode("utf-8")
+                        info = tarfile.TarInfo(prefix + path)
+                        info.size = len(data)
+                        archive.addfile(info, io.BytesIO(data))
+                self._tarball = buffer.getvalue()
+            return self._tarball
+
+
+class FakeGitHub:
+    """
+    Local GitHub REST API stand-in serving one SyntheticRepo, with per-request latency,
+    ETag revalidation, rate-limit headers and per-route request counts.
+    """
+
+    def __init__(self, repo: SyntheticRepo, latency: float = 0.0):
+        self.repo = repo
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.comments = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "FakeGitHub":
+        handler = type("Handler", (FakeGitHubHandler,), {"github": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def count(self, route: str):
+        with self.lock:
+            self.requests[route] += 1
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    github: FakeGitHub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json", etag: Optional[str] = None):
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload, cacheable: bool = True):
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'"{hashlib.md5(body).hexdigest()}"' if cacheable and status == 200 else None
+        self.send_body(status, body, etag=etag)
+
+    def route(self, method: str):
+        repo = self.github.repo
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+        prefix = f"/repos/{repo.owner}/{repo.name}"
+        if self.github.latency:
+            time.sleep(self.github.latency)
+
+        if method == "GET" and path == "/app":
+            return "app", lambda: self.send_json(200, {"id": 1, "name": "IssueWiz Benchmark"})
+        if method == "GET" and path == "/app/installations":
+            return "installations", lambda: self.send_json(200, [{"id": 1, "account": {"login": repo.owner}}])
+        if method == "POST" and re.fullmatch(r"/app/installations/\d+/access_tokens", path):
+            expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 3600))
+            return "access_token", lambda: self.send_json(201, {"token": "bench-token", "expires_at": expires}, cacheable=False)
+        if not path.startswith(prefix):
+            return "not_found", lambda: self.send_json(404, {"message": "Not Found"})
+
+        path = path[len(prefix):]
+        if method == "GET" and path == "/installation":
+            return "installation", lambda: self.send_json(200, {"id": 1})
+        if method == "GET" and path.startswith("/commits/"):
+            return "commit", lambda: self.send_body(200, repo.commit_sha.encode(), "application/vnd.github.sha")
+        if method == "GET" and path.startswith("/git/trees/"):
+            return "tree", lambda: self.send_json(200, repo.tree())
+        if method == "GET" and path.startswith("/contents/"):
+            file_path = path[len("/contents/"):]
+            if file_path not in repo.files:
+                return "contents", lambda: self.send_json(404, {"message": "Not Found"})
+            content = base64.b64encode(repo.files[file_path].encode("utf-8")).decode("ascii")
+            return "contents", lambda: self.send_json(200, {"path": file_path, "encoding": "base64", "content": content})
+        if method == "GET" and path.startswith("/tarball/"):
+            return "tarball", lambda: self.send_body(200, repo.tarball(), "application/x-gzip")
+        if method == "GET" and path == "/issues":
+            per_page = int(query.get("per_page", ["30"])[0])
+            page = int(query.get("page", ["1"])[0])
+            issues = repo.issues[(page - 1) * per_page:page * per_page]
+            return "issues", lambda: self.send_json(200, issues, cacheable=False)
+        match = re.fullmatch(r"/issues/(\d+)(/comments)?", path)
+        if match and method == "GET" and not match.group(2):
+            number = int(match.group(1))
+            if not 1 <= number <= len(repo.issues):
+                return "issue", lambda: self.send_json(404, {"message": "Not Found"})
+            return "issue", lambda: self.send_json(200, repo.issues[number - 1])
+        if match and method == "POST" and match.group(2):
+            with self.github.lock:
+                self.github.comments += 1
+            return "comment", lambda: self.send_json(201, {"id": self.github.comments}, cacheable=False)
+        return "not_found", lambda: self.send_json(404, {"message": "Not Found"})
+
+    def handle_method(self, method: str):
+        # Drain the request body so the keep-alive connection can be reused.
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        route, respond = self.route(method)
+        self.github.count(f"{method} {route}")
+        respond()
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
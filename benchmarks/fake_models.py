@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import List
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from tools.lexical_index import tokenize
+
+# Calls, texts and tokens seen by every fake client in the process.
+usage = Counter()
+usage_lock = threading.Lock()
+
+
+def count(**values):
+    with usage_lock:
+        usage.update(values)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class FakeEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding model: hashed bag of identifier tokens, L2-normalized, so texts
+    sharing identifiers are close. Each batch sleeps `latency` seconds like a remote call.
+    """
+
+    dim: int = 256
+    latency: float = 0.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text) or [text]:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        count(embedding_calls=1, embedding_texts=len(texts))
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._embed, texts)
+
+
+def fake_embedding_factory(latency: float = 0.0):
+    """Constructor with the signature of the provider embedding classes used by get_embedding_model."""
+    def create(model: str = None, model_name: str = None, api_key: str = None, embed_batch_size: int = 10, **kwargs):
+        return FakeEmbedding(model_name=f"fake-{model or model_name}", embed_batch_size=embed_batch_size, latency=latency)
+    return create
+
+
+class FakeChatClient:
+    """
+    Stand-in for AsyncOpenAI's streaming chat completions that triages an issue deterministically:
+    get_issue_details, then retrieve_context with the issue text, then post_comment.
+    `latency` is the time to first token; the reply then streams in a few chunks.
+    """
+
+    latency = 0.0
+
+    def __init__(self, api_key: str = None, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @staticmethod
+    def next_step(messages: list):
+        user = next(message["content"] for message in messages if message.get("role") == "user")
+        owner, repo, number = re.search(r"github\.com/([^/]+)/([^/]+)/issues/(\d+)", user).groups()
+        branch_match = re.search(r"use (\S+) branch", user)
+        branch = branch_match.group(1) if branch_match else "main"
+
+        called = {}
+        for message in messages:
+            if message.get("role") == "assistant":
+                for tool_call in message.get("tool_calls") or []:
+                    called[tool_call["id"]] = tool_call["function"]["name"]
+        results = {called.get(message.get("tool_call_id")): message["content"] for message in messages if message.get("role") == "tool"}
+
+        if "get_issue_details" not in results:
+            return "get_issue_details", {"owner": owner, "repo": repo, "issue_num": number}
+        if "retrieve_context" not in results:
+            issue = json.loads(results["get_issue_details"])
+            description = f"{issue.get('title', '')}\n{issue.get('body', '')}"
+            return "retrieve_context", {"owner": owner, "repo": repo, "ref": branch, "issue_description": description}
+        if "post_comment" not in results:
+            context = results["retrieve_context"]
+            location = next((line[4:] for line in context.splitlines() if line.startswith("### ")), "the code")
+            body = f"The failure most likely comes from {location}. Return early when the payload is empty instead of raising."
+            return "post_comment", {"owner": owner, "repo": repo, "issue_num": number, "comment_body": body}
+        return None, "The issue has been triaged."
+
+    async def create(self, model: str, messages: list, tools=None, tool_choice=None, stream: bool = False, stream_options=None, **kwargs):
+        prompt_tokens = estimate_tokens(json.dumps(messages, default=str))
+        name, arguments = self.next_step(messages)
+        output = json.dumps(arguments) if name else arguments
+        completion_tokens = estimate_tokens(output)
+        count(llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+        async def chunks():
+            await asyncio.sleep(self.latency)
+            pieces = [output[i:i + 64] for i in range(0, len(output), 64)] or [""]
+            for position, piece in enumerate(pieces):
+                if name:
+                    tool_call = SimpleNamespace(
+                        index=0, id=f"call_{len(messages)}" if position == 0 else None,
+                        function=SimpleNamespace(name=name if position == 0 else None, arguments=piece),
+                    )
+                    delta = SimpleNamespace(content=None, tool_calls=[tool_call])
+                else:
+                    delta = SimpleNamespace(content=piece, tool_calls=None)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            yield SimpleNamespace(
+                choices=[],
+                usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+            )
+
+        return chunks()
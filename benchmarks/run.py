@@ -0,0 +1,218 @@
+"""
+Offline end-to-end benchmarks for IssueWise.
+
+Every case runs in a fresh Python process against a local fake GitHub API serving a synthetic
+repository, with deterministic fake chat and embedding clients, so results are reproducible
+and need no network access or API keys. Example:
+
+    python -m benchmarks.run --files 1000 10000 --concurrency 1 4 --scenario select index agent
+
+Scenarios:
+    select  select_relevant_files_semantic for each issue, over all repository paths
+    index   build_repo_index for each issue (one shared commit, so later builds extend the index)
+    agent   run_agent for each issue, end to end
+
+With --repeat N the case is run N times in the same process; runs after the first see warm caches.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("select", "index", "agent")
+RESULT_PREFIX = "BENCHMARK_RESULT "
+COLUMNS = (
+    ("scenario", "{}"), ("files", "{}"), ("concurrency", "{}"), ("run", "{}"), ("wall_time_s", "{:.2f}"),
+    ("issues_per_min", "{:.1f}"), ("github_requests", "{}"), ("embedding_calls", "{}"), ("embedding_texts", "{}"),
+    ("llm_calls", "{}"), ("prompt_tokens", "{}"), ("completion_tokens", "{}"), ("peak_rss_mb", "{:.0f}"),
+)
+
+
+def write_private_key(path: str):
+    """Write a throwaway RSA key in the PKCS#1 PEM format config.py expects."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+
+
+def configure_environment(workdir: str, github_url: str):
+    """Point IssueWise at the fake GitHub API and keep all of its state inside `workdir`."""
+    key_path = os.path.join(workdir, "app.pem")
+    write_private_key(key_path)
+    os.environ.update({
+        "GITHUB_API_URL": github_url,
+        "APP_ID": "1",
+        "APP_PRIVATE_KEY_PATH": key_path,
+        "MISTRAL_API_KEY": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+        "INDEX_STORE_DIR": os.path.join(workdir, "indexes"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "HTTP_CACHE_PATH": os.path.join(workdir, "http_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "TRACE_LOG_PATH": "",
+    })
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def gather_limited(concurrency: int, calls):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(limited(call) for call in calls))
+
+
+async def run_scenario(scenario: str, repo, concurrency: int):
+    from agent.core import run_agent
+    from tools.code_index import build_repo_index, select_relevant_files_semantic
+    from config import INDEX_TOP_FILES
+
+    descriptions = [f"{issue['title']}\n{issue['body']}" for issue in repo.issues]
+    if scenario == "select":
+        paths = list(repo.files)
+        calls = [
+            lambda description=description: asyncio.to_thread(select_relevant_files_semantic, description, paths, "openai", INDEX_TOP_FILES)
+            for description in descriptions
+        ]
+    elif scenario == "index":
+        calls = [
+            lambda description=description: build_repo_index(repo.owner, repo.name, "main", description, "openai")
+            for description in descriptions
+        ]
+    else:
+        async def triage(issue_url: str):
+            async for _ in run_agent(issue_url, "main", "openai"):
+                pass
+        calls = [lambda url=issue["html_url"]: triage(url) for issue in repo.issues]
+    await gather_limited(concurrency, calls)
+
+
+def run_case(scenario: str, num_files: int, concurrency: int, args) -> list:
+    """Run one benchmark case in this process and return one result per repeat."""
+    from benchmarks.fake_github import FakeGitHub, SyntheticRepo
+
+    repo = SyntheticRepo(num_files=num_files, num_issues=args.issues, seed=args.seed)
+    github = FakeGitHub(repo, latency=args.github_latency).start()
+    workdir = tempfile.mkdtemp(prefix="issuewise-bench-")
+    configure_environment(workdir, github.url)
+
+    import logging
+    import openai
+    import tools.code_index
+    from benchmarks.fake_models import FakeChatClient, fake_embedding_factory, usage
+
+    logging.getLogger().setLevel(logging.WARNING)
+    embedding_factory = fake_embedding_factory(args.embed_latency)
+    tools.code_index.OpenAIEmbedding = embedding_factory
+    tools.code_index.MistralAIEmbedding = embedding_factory
+    # get_model_client imports the client class on each call, so patching the module is enough.
+    openai.AsyncOpenAI = FakeChatClient
+    FakeChatClient.latency = args.llm_latency
+
+    results = []
+    for run in range(1, args.repeat + 1):
+        usage_before = dict(usage)
+        requests_before = github.total_requests()
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(run_scenario(scenario, repo, concurrency))
+        wall_time = time.perf_counter() - started
+
+        delta = {key: usage.get(key, 0) - usage_before.get(key, 0) for key in ("embedding_calls", "embedding_texts", "llm_calls", "prompt_tokens", "completion_tokens")}
+        results.append({
+            "scenario": scenario,
+            "files": num_files,
+            "concurrency": concurrency,
+            "run": run,
+            "issues": len(repo.issues),
+            "wall_time_s": wall_time,
+            "issues_per_min": len(repo.issues) / wall_time * 60 if wall_time else 0.0,
+            "github_requests": github.total_requests() - requests_before,
+            **delta,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    results[-1]["github_requests_by_route"] = dict(github.requests)
+    github.stop()
+    return results
+
+
+def format_table(results: list) -> str:
+    header = [name for name, _ in COLUMNS]
+    rows = [[template.format(result.get(name, 0)) for name, template in COLUMNS] for result in results]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *rows)]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline IssueWise benchmarks with local GitHub and model stand-ins.")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--files", nargs="+", type=int, default=[1000, 10000], help="Synthetic repository sizes")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4], help="Issues processed concurrently")
+    parser.add_argument("--issues", type=int, default=8, help="Issues per case")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case in one process (later runs are warm)")
+    parser.add_argument("--github-latency", type=float, default=0.005, help="Seconds added to every fake GitHub response")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds to first token of fake completions")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Seconds per fake embedding batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.case:
+        scenario, num_files, concurrency = args.case.split(":")
+        for result in run_case(scenario, int(num_files), int(concurrency), args):
+            print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return
+
+    passthrough = [
+        "--issues", str(args.issues), "--repeat", str(args.repeat), "--seed", str(args.seed),
+        "--github-latency", str(args.github_latency), "--llm-latency", str(args.llm_latency),
+        "--embed-latency", str(args.embed_latency),
+    ]
+    results = []
+    for scenario, num_files, concurrency in itertools.product(args.scenario, args.files, args.concurrency):
+        print(f"[Benchmark] {scenario}: {num_files} files, concurrency {concurrency}...", file=sys.stderr)
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--case", f"{scenario}:{num_files}:{concurrency}", *passthrough],
+            capture_output=True, text=True,
+        )
+        case_results = [json.loads(line[len(RESULT_PREFIX):]) for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if completed.returncode != 0 or not case_results:
+            print(f"[Benchmark] Case failed:\n{completed.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.extend(case_results)
+
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
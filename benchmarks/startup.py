@@ -0,0 +1,94 @@
+"""
+Cold-start benchmark: import cost of the IssueWise entry points.
+
+Each module is imported in a fresh Python process under `python -X importtime`, `--repeat`
+times. The report shows the median wall time of the import and the packages that
+contributed the most import time, so a dependency that is pulled in eagerly again shows up.
+Example:
+
+    python -m benchmarks.startup --modules app webhook agent.core --repeat 5
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+DEFAULT_MODULES = ("config", "agent.core", "app", "webhook", "tools.code_index")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def package_import_times(importtime_output: str) -> dict:
+    """Seconds spent importing each top-level package, from its modules' self times."""
+    seconds = defaultdict(float)
+    for line in importtime_output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, _, _, module = match.groups()
+            seconds[module.split(".")[0]] += int(self_us) / 1e6
+    return dict(seconds)
+
+
+def measure_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter and return its wall time and per-package import times."""
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise Exception(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return {
+        "wall_time_s": float(completed.stdout.strip().splitlines()[-1]),
+        "packages": package_import_times(completed.stderr),
+    }
+
+
+def benchmark_module(module: str, repeat: int) -> dict:
+    runs = [measure_import(module) for _ in range(repeat)]
+    packages = defaultdict(list)
+    for run in runs:
+        for package, seconds in run["packages"].items():
+            packages[package].append(seconds)
+    return {
+        "module": module,
+        "wall_time_s": statistics.median(run["wall_time_s"] for run in runs),
+        "min_wall_time_s": min(run["wall_time_s"] for run in runs),
+        "packages": {package: statistics.median(times) for package, times in packages.items()},
+    }
+
+
+def format_report(results: list, top: int) -> str:
+    lines = []
+    for result in results:
+        lines.append(f"{result['module']}: {result['wall_time_s']:.3f}s median, {result['min_wall_time_s']:.3f}s min")
+        slowest = sorted(result["packages"].items(), key=lambda item: -item[1])[:top]
+        width = max((len(package) for package, _ in slowest), default=0)
+        for package, seconds in slowest:
+            lines.append(f"  {package.ljust(width)}  {seconds:.3f}s")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of IssueWise entry points.")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES), help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh-process imports per module")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed per module")
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    for module in args.modules:
+        print(f"[Benchmark] Importing {module} {args.repeat} times...", file=sys.stderr)
+        results.append(benchmark_module(module, args.repeat))
+
+    print(format_report(results, args.top))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,34 @@ from dotenv import load_dotenv
 import logging
 import base64
 import re
+import threading
 from pathlib import Path
 
+load_dotenv()
+
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 # AI Model API Keys
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # GitHub App Configuration
 APP_ID = os.getenv("APP_ID")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# Maximum concurrent in-flight requests of the async GitHub client, and its timeout in seconds
+GITHUB_MAX_CONCURRENCY = int(os.getenv("GITHUB_MAX_CONCURRENCY", "16"))
+GITHUB_REQUEST_TIMEOUT = float(os.getenv("GITHUB_REQUEST_TIMEOUT", "30"))
+# Seconds an owner/repo -> installation ID lookup is cached
+INSTALLATION_ID_TTL = int(os.getenv("INSTALLATION_ID_TTL", "3600"))
+# Requests left in a rate-limit window that are held back; further requests queue until the reset
+RATE_LIMIT_RESERVE = int(os.getenv("RATE_LIMIT_RESERVE", "2"))
+# Conditional-request (ETag/Last-Modified) cache of GitHub responses; 304s do not count against the rate limit
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(".issuewise", "http_cache.sqlite3"))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "50000"))
 
 def load_private_key_from_file(file_path: str) -> str:
     """Load private key from a PEM file."""
@@ -86,22 +100,120 @@ def load_private_key() -> str:
     
     return format_private_key(key)
 
-try:
-    APP_PRIVATE_KEY = load_private_key()
-except Exception as e:
-    logger.error("Failed to load private key: %s", str(e))
-    raise
+app_private_key = None
+app_private_key_lock = threading.Lock()
+
+def get_app_private_key() -> str:
+    """Load and validate the GitHub App private key on first use (the first GitHub request), then reuse it."""
+    global app_private_key
+    with app_private_key_lock:
+        if app_private_key is None:
+            try:
+                app_private_key = load_private_key()
+            except Exception as e:
+                logger.error("Failed to load private key: %s", str(e))
+                raise
+        return app_private_key
+
+# Local storage for persisted repository indexes
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", os.path.join(".issuewise", "indexes"))
+# Reuse the last stored index of a repo and only re-embed files whose blob SHA changed
+INCREMENTAL_INDEXING = os.getenv("INCREMENTAL_INDEXING", "true").lower() in ("1", "true", "yes")
+# Persisted commits kept on disk per repo and embedding model; older ones are removed after each update
+INDEX_KEEP_COMMITS = int(os.getenv("INDEX_KEEP_COMMITS", "3"))
+# Number of repo indexes kept loaded in memory per process
+LOADED_INDEX_CACHE_SIZE = int(os.getenv("LOADED_INDEX_CACHE_SIZE", "8"))
+# Vector store for new indexes: "quantized" (compressed codes with IVF search) or "simple"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "quantized").lower()
+# Quantized store codes: "float16", "int8" or "auto" (float16 until VECTOR_STORE_MEMORY_MB is reached)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "auto").lower()
+# Memory for the vector codes of each loaded index; codes beyond it are memory-mapped from disk.
+# Full-precision vectors always stay on disk; node text in the docstore is not counted.
+VECTOR_STORE_MEMORY_MB = int(os.getenv("VECTOR_STORE_MEMORY_MB", "256"))
+# Approximate search: inverted lists probed per query, once an index holds VECTOR_STORE_IVF_MIN_VECTORS vectors
+VECTOR_STORE_NPROBE = int(os.getenv("VECTOR_STORE_NPROBE", "8"))
+VECTOR_STORE_IVF_MIN_VECTORS = int(os.getenv("VECTOR_STORE_IVF_MIN_VECTORS", "20000"))
+# Candidates re-ranked with full-precision vectors, as a multiple of top_k
+VECTOR_STORE_RERANK = int(os.getenv("VECTOR_STORE_RERANK", "4"))
+
+# Fetch file contents from the repository tarball instead of the contents API
+# when more than this many files need fetching ("0" always uses the tarball)
+ARCHIVE_FETCH_THRESHOLD = int(os.getenv("ARCHIVE_FETCH_THRESHOLD", "20"))
+
+# Embedding requests
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Content-addressed on-disk cache of embedding vectors, shared by all workers on the host
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".issuewise", "embeddings"))
+
+# Record/replay cache of chat and LLM responses: "off", "record" (serve recorded responses and
+# record new ones) or "replay" (serve recorded responses only, never call the providers).
+# Embeddings are recorded in the embedding cache above, which is always used when this is not "off"
+MODEL_CACHE_MODE = os.getenv("MODEL_CACHE_MODE", "off").lower()
+MODEL_CACHE_PATH = os.getenv("MODEL_CACHE_PATH", os.path.join(".issuewise", "model_cache.sqlite3"))
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Code chunking: files are indexed as function/class-level nodes, so more files fit the same budget
+INDEX_TOP_FILES = int(os.getenv("INDEX_TOP_FILES", "5"))
+CHUNK_MAX_LINES = int(os.getenv("CHUNK_MAX_LINES", "120"))
+
+# Lexical (BM25) pre-filter: at most this many best matching paths are embedded per issue,
+# and retrieval fuses this many lexical and vector candidates with reciprocal-rank fusion
+LEXICAL_PATH_CANDIDATES = int(os.getenv("LEXICAL_PATH_CANDIDATES", "300"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# retrieve_context mode: "raw" returns the ranked code chunks to the agent within a token budget,
+# "synthesize" summarizes them with an extra LLM call first
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "raw")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "4000"))
+# Number of retrieve_context results memoized per process
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))
+
+# Agent tool call timeouts in seconds
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+RETRIEVE_CONTEXT_TIMEOUT = float(os.getenv("RETRIEVE_CONTEXT_TIMEOUT", "900"))
+
+# Agent conversation budget in tokens: tool results are serialized compactly and capped at
+# TOOL_RESULT_MAX_TOKENS; when the conversation exceeds AGENT_CONTEXT_TOKEN_BUDGET, older tool
+# results are shortened to COMPACTED_TOOL_RESULT_TOKENS before the next completion
+AGENT_CONTEXT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "12000"))
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "6000"))
+COMPACTED_TOOL_RESULT_TOKENS = int(os.getenv("COMPACTED_TOOL_RESULT_TOKENS", "200"))
+
+# Webhook service: mentions of WEBHOOK_MENTION in issue comments are queued and processed by a worker pool
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MENTION = os.getenv("WEBHOOK_MENTION", "@IssueWiz")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_PER_REPO_CONCURRENCY = int(os.getenv("WEBHOOK_PER_REPO_CONCURRENCY", "1"))
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(".issuewise", "jobs.sqlite3"))
+# Running jobs renew their lease while they run; jobs whose lease expired (their process died) are re-queued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+DEFAULT_MODEL_TYPE = os.getenv("DEFAULT_MODEL_TYPE", "mistral")
+
+# Backlog triage: number of issues processed concurrently
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Tracing: finished spans are appended to this JSON lines file (empty disables the file export;
+# metrics are always served on /metrics by webhook.py)
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
 
 # Available Models Configuration
+# Prices are USD per million tokens and only used for cost estimates in batch summaries
 AVAILABLE_MODELS = {
     "mistral": {
         "name": "Mistral AI",
         "model": "mistral-small-latest",
-        "api_key": MISTRAL_API_KEY
+        "api_key": MISTRAL_API_KEY,
+        "prompt_price": float(os.getenv("MISTRAL_PROMPT_PRICE", "0")),
+        "completion_price": float(os.getenv("MISTRAL_COMPLETION_PRICE", "0")),
     },
     "openai": {
         "name": "OpenAI",
         "model": "gpt-4-turbo-preview",
-        "api_key": OPENAI_API_KEY
+        "api_key": OPENAI_API_KEY,
+        "prompt_price": float(os.getenv("OPENAI_PROMPT_PRICE", "0")),
+        "completion_price": float(os.getenv("OPENAI_COMPLETION_PRICE", "0")),
     }
 }
\ No newline at end of file
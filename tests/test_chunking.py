@@ -0,0 +1,45 @@
+from tools.chunking import js_chunks
+
+
+def declarations(text):
+    return [(chunk.symbol, chunk.start_line, chunk.end_line) for chunk in js_chunks(text) if chunk.kind != "module"]
+
+
+def test_brace_inside_multiline_block_comment_is_ignored():
+    text = "\n".join([
+        "function first() {",
+        "  /* an unbalanced brace {",
+        "     stays in the comment */",
+        "  return 1;",
+        "}",
+        "function second() {",
+        "  return 2;",
+        "}",
+    ])
+    assert declarations(text) == [("first", 1, 5), ("second", 6, 8)]
+
+
+def test_brace_inside_multiline_template_literal_is_ignored():
+    text = "\n".join([
+        "const render = (name) => {",
+        "  return `<div>",
+        "    } closing brace in markup",
+        "  </div>`;",
+        "};",
+        "export function after() {",
+        "  return render('x');",
+        "}",
+    ])
+    assert declarations(text) == [("render", 1, 5), ("after", 6, 8)]
+
+
+def test_unbalanced_declaration_falls_back_to_module_chunks():
+    text = "\n".join([
+        "function broken() {",
+        "  if (x) {",
+        "    return 1;",
+        "}",
+    ])
+    chunks = js_chunks(text)
+    assert [chunk.kind for chunk in chunks] == ["module"]
+    assert (chunks[0].start_line, chunks[0].end_line) == (1, 4)
@@ -0,0 +1,46 @@
+import asyncio
+from collections import OrderedDict
+import pytest
+import tools.code_index as code_index
+from tools.tracing import RunTrace, check_cancelled, current_trace
+
+
+def test_cancelled_leader_does_not_fail_waiting_run(monkeypatch):
+    computations = []
+
+    async def resolve_commit_sha(owner, repo, ref):
+        return "a" * 40
+
+    async def compute_context(owner, repo, ref, commit_sha, issue_description, model_type, mode):
+        computations.append(commit_sha)
+        await asyncio.sleep(0.2)
+        # Would raise if the shared computation still followed the leader run's cancel flag.
+        check_cancelled()
+        return "shared context"
+
+    monkeypatch.setattr(code_index, "resolve_commit_sha", resolve_commit_sha)
+    monkeypatch.setattr(code_index, "compute_context", compute_context)
+    monkeypatch.setattr(code_index, "retrieval_results", OrderedDict())
+    monkeypatch.setattr(code_index, "retrieval_in_flight", {})
+
+    async def run(trace):
+        current_trace.set(trace)
+        return await code_index.memoized_context("owner", "repo", "main", "Crash on empty payload", "openai", "raw")
+
+    async def scenario():
+        leader_trace = RunTrace()
+        leader = asyncio.create_task(run(leader_trace))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(run(RunTrace()))
+        await asyncio.sleep(0.05)
+
+        # What run_agent does when the Stop button or a tool timeout cancels the run.
+        leader_trace.cancel()
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(scenario()) == "shared context"
+    assert len(computations) == 1
+    assert code_index.retrieval_in_flight == {}
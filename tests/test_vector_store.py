@@ -0,0 +1,115 @@
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from tools.vector_store import QuantizedVectorStore, dequantize, normalize_rows, quantize
+
+
+def clustered_vectors(count, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(50, dim))
+    return (centers[rng.integers(0, 50, count)] + 0.5 * rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def make_node(node_id, vector, doc_id):
+    return TextNode(
+        id_=node_id, text="", embedding=vector.tolist(),
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+def make_nodes(vectors, start=0, docs=1):
+    return [make_node(f"n{i}", vectors[i], f"doc{i % docs}") for i in range(start, len(vectors))]
+
+
+def exact_top_k(vectors, query, k):
+    return {f"n{i}" for i in np.argsort(-(normalize_rows(vectors) @ normalize_rows([query])[0]))[:k]}
+
+
+def search(store, query, k, **kwargs):
+    return store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k, **kwargs))
+
+
+def test_quantize_round_trip_error_bounds():
+    vectors = normalize_rows(np.random.default_rng(1).normal(size=(500, 384)))
+
+    codes, scales = quantize(vectors, "int8")
+    assert codes.dtype == np.int8
+    # Rounding to the nearest step is off by at most half a step per component.
+    error = np.abs(dequantize(codes, scales) - vectors)
+    assert np.all(error <= scales[:, None] / 2 + 1e-7)
+    cosine = np.sum(normalize_rows(dequantize(codes, scales)) * vectors, axis=1)
+    assert cosine.min() > 0.999
+
+    codes, scales = quantize(vectors, "float16")
+    assert codes.dtype == np.float16
+    assert np.abs(dequantize(codes, scales) - vectors).max() < 1e-3
+
+
+def test_ivf_probe_recall_matches_exact_search():
+    # Queries are held-out points from the same clusters as the indexed vectors.
+    vectors, queries = np.split(clustered_vectors(6030, 64), [6000])
+    store = QuantizedVectorStore(ivf_min_vectors=2000, nprobe=8, rerank=4)
+    for start in range(0, len(vectors), 1000):
+        store.add(make_nodes(vectors[:start + 1000], start))
+    assert store._centroids is not None
+
+    found = 0
+    for query in queries:
+        result = search(store, query, 10)
+        found += len(set(result.ids) & exact_top_k(vectors, query, 10))
+        # Returned similarities are exact cosine similarities, not approximations from the codes.
+        expected = normalize_rows(vectors[[int(node_id[1:]) for node_id in result.ids]]) @ normalize_rows([query])[0]
+        assert np.allclose(result.similarities, expected, atol=1e-5)
+    assert found / (10 * len(queries)) >= 0.9
+
+
+def test_delete_persist_and_load(tmp_path):
+    vectors = clustered_vectors(300, 32)
+    store = QuantizedVectorStore(dtype="int8")
+    store.add(make_nodes(vectors, docs=10))
+    store.delete("doc3")
+    store.delete_nodes(["n0"])
+
+    path = str(tmp_path / "default__vector_store.json")
+    store.persist(path)
+    loaded = QuantizedVectorStore.from_persist_path(path)
+
+    deleted = {f"n{i}" for i in range(300) if i % 10 == 3} | {"n0"}
+    assert loaded._alive_count == 300 - len(deleted)
+    for query in vectors[:20]:
+        before, after = search(store, query, 5), search(loaded, query, 5)
+        assert before.ids == after.ids
+        assert not set(after.ids) & deleted
+
+    # Rows added after loading are searchable alongside the persisted ones.
+    loaded.add([make_node("new", -vectors[5], "doc-new")])
+    assert search(loaded, -vectors[5], 1).ids == ["new"]
+
+
+def test_auto_dtype_switches_to_int8_and_spills_within_budget(tmp_path):
+    dim = 256
+    vectors = clustered_vectors(6000, dim)
+    # 1 MB holds 2048 float16 rows or 4096 int8 rows of 256 dimensions.
+    store = QuantizedVectorStore(dtype="auto", memory_budget_mb=1)
+
+    store.add(make_nodes(vectors[:1000]))
+    assert store._codes.dtype == np.float16
+    assert not isinstance(store._codes, np.memmap)
+
+    store.add(make_nodes(vectors[:3000], 1000))
+    assert store._codes.dtype == np.int8
+    assert not isinstance(store._codes, np.memmap)
+
+    store.add(make_nodes(vectors, 3000))
+    assert store._codes.dtype == np.int8
+    assert isinstance(store._codes, np.memmap)
+
+    for query in vectors[:10]:
+        assert search(store, query, 5).ids[0] in exact_top_k(vectors, query, 1)
+
+    path = str(tmp_path / "default__vector_store.json")
+    store.persist(path)
+    loaded = QuantizedVectorStore.from_persist_path(path)
+    assert loaded._codes.dtype == np.int8
+    for query in vectors[:10]:
+        assert search(loaded, query, 5).ids == search(store, query, 5).ids
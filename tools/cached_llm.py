@@ -0,0 +1,86 @@
+from typing import Sequence
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, CompletionResponse
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms.llm import LLM
+from tools.model_cache import lookup, record, request_key
+
+
+class CachedLLM(LLM):
+    """
+    LlamaIndex LLM wrapper that records and replays chat and completion responses.
+    Streaming calls are passed through to the wrapped model.
+    """
+
+    _inner: LLM = PrivateAttr()
+
+    def __init__(self, inner: LLM, **kwargs):
+        super().__init__(callback_manager=inner.callback_manager, **kwargs)
+        self._inner = inner
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedLLM"
+
+    @property
+    def metadata(self):
+        return self._inner.metadata
+
+    def _chat_key(self, messages: Sequence[ChatMessage], kwargs: dict) -> str:
+        return request_key(
+            "llm.chat", provider=self._inner.class_name(), model=self.metadata.model_name,
+            messages=[message.model_dump(mode="json") for message in messages], params=kwargs,
+        )
+
+    def _complete_key(self, prompt: str, formatted: bool, kwargs: dict) -> str:
+        return request_key(
+            "llm.complete", provider=self._inner.class_name(), model=self.metadata.model_name,
+            prompt=prompt, formatted=formatted, params=kwargs,
+        )
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs) -> ChatResponse:
+        key = self._chat_key(messages, kwargs)
+        recorded = lookup(key, "llm.chat")
+        if recorded is not None:
+            return ChatResponse(message=ChatMessage.model_validate(recorded))
+        response = self._inner.chat(messages, **kwargs)
+        record(key, "llm.chat", response.message.model_dump(mode="json"))
+        return response
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs) -> ChatResponse:
+        key = self._chat_key(messages, kwargs)
+        recorded = lookup(key, "llm.chat")
+        if recorded is not None:
+            return ChatResponse(message=ChatMessage.model_validate(recorded))
+        response = await self._inner.achat(messages, **kwargs)
+        record(key, "llm.chat", response.message.model_dump(mode="json"))
+        return response
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        key = self._complete_key(prompt, formatted, kwargs)
+        recorded = lookup(key, "llm.complete")
+        if recorded is not None:
+            return CompletionResponse(text=recorded)
+        response = self._inner.complete(prompt, formatted=formatted, **kwargs)
+        record(key, "llm.complete", response.text)
+        return response
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        key = self._complete_key(prompt, formatted, kwargs)
+        recorded = lookup(key, "llm.complete")
+        if recorded is not None:
+            return CompletionResponse(text=recorded)
+        response = await self._inner.acomplete(prompt, formatted=formatted, **kwargs)
+        record(key, "llm.complete", response.text)
+        return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs):
+        return self._inner.stream_chat(messages, **kwargs)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        return self._inner.stream_complete(prompt, formatted=formatted, **kwargs)
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs):
+        return await self._inner.astream_chat(messages, **kwargs)
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        return await self._inner.astream_complete(prompt, formatted=formatted, **kwargs)
@@ -0,0 +1,209 @@
+import ast
+import os
+import re
+from typing import List, Optional, Tuple
+from llama_index.core import Document
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from config import CHUNK_MAX_LINES
+
+
+PYTHON_EXTENSIONS = {".py"}
+JS_EXTENSIONS = {".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"}
+
+# Metadata that is useful to show the agent but only adds noise to embeddings.
+EXCLUDED_EMBED_METADATA_KEYS = ["kind", "start_line", "end_line", "language"]
+
+# Top-level JS/TS declarations: functions, classes, arrow functions and TS types.
+JS_DECLARATION_PATTERN = re.compile(
+    r"^(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:"
+    r"(?:async\s+)?function\s*\*?\s*(?P<function>[\w$]+)"
+    r"|(?:abstract\s+)?class\s+(?P<class>[\w$]+)"
+    r"|(?:const|let|var)\s+(?P<variable>[\w$]+)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[\w$]+\s*=>)"
+    r"|interface\s+(?P<interface>[\w$]+)"
+    r"|(?:const\s+)?enum\s+(?P<enum>[\w$]+)"
+    r"|type\s+(?P<type>[\w$]+)\s*(?:<[^>]*>)?\s*="
+    r")"
+)
+JS_KINDS = {"function": "function", "class": "class", "variable": "function", "interface": "type", "enum": "type", "type": "type"}
+# Comments and string literals; block comments and template literals may span lines, quoted strings may not.
+JS_STRING_OR_COMMENT = re.compile(r"//.*?$|/\*.*?\*/|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`", re.S | re.M)
+
+sentence_splitter = SentenceSplitter()
+
+
+class Chunk:
+    """A line range of a source file with the symbol it defines."""
+
+    def __init__(self, start_line: int, end_line: int, symbol: str, kind: str):
+        self.start_line = start_line
+        self.end_line = end_line
+        self.symbol = symbol
+        self.kind = kind
+
+
+def uncovered_ranges(covered: List[Tuple[int, int]], first: int, last: int) -> List[Tuple[int, int]]:
+    """Line ranges within [first, last] not covered by any of the `covered` ranges."""
+    ranges = []
+    start = first
+    for covered_start, covered_end in sorted(covered) + [(last + 1, last + 1)]:
+        if covered_start > start:
+            ranges.append((start, covered_start - 1))
+        start = max(start, covered_end + 1)
+    return ranges
+
+
+def python_chunks(text: str) -> Optional[List[Chunk]]:
+    """Split Python source into module-level, function, class and (for large classes) method chunks."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+    def start_of(node) -> int:
+        return min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+
+    definitions = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    chunks = []
+    for node in tree.body:
+        if not isinstance(node, definitions):
+            continue
+        start, end = start_of(node), node.end_lineno
+        kind = "class" if isinstance(node, ast.ClassDef) else "function"
+        methods = [child for child in node.body if isinstance(child, definitions)] if kind == "class" else []
+        if not methods or end - start < CHUNK_MAX_LINES:
+            chunks.append(Chunk(start, end, node.name, kind))
+            continue
+
+        # Large class: one chunk per method, the class line and attributes go into class chunks.
+        method_ranges = [(start_of(method), method.end_lineno) for method in methods]
+        for method, (method_start, method_end) in zip(methods, method_ranges):
+            chunks.append(Chunk(method_start, method_end, f"{node.name}.{method.name}", "method"))
+        for gap_start, gap_end in uncovered_ranges(method_ranges, start, end):
+            chunks.append(Chunk(gap_start, gap_end, node.name, "class"))
+
+    covered = [(start_of(node), node.end_lineno) for node in tree.body if isinstance(node, definitions)]
+    for gap_start, gap_end in uncovered_ranges(covered, 1, len(text.splitlines())):
+        chunks.append(Chunk(gap_start, gap_end, "<module>", "module"))
+    return chunks
+
+
+def js_code_lines(text: str) -> List[str]:
+    """
+    Lines of JS/TS source with comments and string literals removed. The whole text is scanned at
+    once, so multi-line block comments and template literals are removed too; their line breaks
+    are kept, so the lines still line up with text.splitlines().
+    """
+    return JS_STRING_OR_COMMENT.sub(lambda match: "\n" * (len(match.group(0).splitlines()) - 1), text).splitlines()
+
+
+def js_block_end(code_lines: List[str], start: int) -> Optional[int]:
+    """
+    Index of the line closing the declaration that starts at `start`, by brace matching over
+    js_code_lines. None when the brackets never balance (e.g. code the patterns cannot read).
+    """
+    depth = 0
+    opened = False
+    for index in range(start, len(code_lines)):
+        code = code_lines[index]
+        for char in code:
+            if char in "{([":
+                depth += 1
+                opened = opened or char == "{"
+            elif char in "})]":
+                depth -= 1
+        if depth <= 0 and (opened or code.rstrip().endswith(";") or index > start):
+            return index
+    return None
+
+
+def js_chunks(text: str) -> List[Chunk]:
+    """Split JS/TS source into top-level declaration chunks using declaration patterns and brace matching."""
+    lines = text.splitlines()
+    code_lines = js_code_lines(text)
+    chunks = []
+    index = 0
+    while index < len(lines):
+        match = JS_DECLARATION_PATTERN.match(lines[index])
+        if not match:
+            index += 1
+            continue
+        group = next(name for name, value in match.groupdict().items() if value)
+        start = index
+        # Keep directly preceding comment / decorator lines with the declaration.
+        while start > 0 and lines[start - 1].lstrip().startswith(("//", "/*", "*", "@")):
+            start -= 1
+        end = js_block_end(code_lines, index)
+        if end is None:
+            # Unbalanced brackets: leave the lines to the module chunks, which are split into windows.
+            index += 1
+            continue
+        chunks.append(Chunk(start + 1, end + 1, match.group(group), JS_KINDS[group]))
+        index = end + 1
+
+    covered = [(chunk.start_line, chunk.end_line) for chunk in chunks]
+    for gap_start, gap_end in uncovered_ranges(covered, 1, len(lines)):
+        chunks.append(Chunk(gap_start, gap_end, "<module>", "module"))
+    return chunks
+
+
+def split_long_chunk(chunk: Chunk) -> List[Chunk]:
+    """Split chunks longer than CHUNK_MAX_LINES into consecutive windows so none exceed embedding limits."""
+    if chunk.end_line - chunk.start_line < CHUNK_MAX_LINES:
+        return [chunk]
+    parts = []
+    for part, start in enumerate(range(chunk.start_line, chunk.end_line + 1, CHUNK_MAX_LINES), start=1):
+        end = min(start + CHUNK_MAX_LINES - 1, chunk.end_line)
+        parts.append(Chunk(start, end, f"{chunk.symbol} (part {part})", chunk.kind))
+    return parts
+
+
+def chunk_document(document: Document) -> List[TextNode]:
+    """
+    Split a file Document into nodes. Python and JS/TS files become one node per function,
+    class (or method of a large class) and module-level block, with symbol names and line ranges
+    in the metadata; other files fall back to sentence-based splitting.
+    """
+    path = document.metadata["file_path"]
+    _, ext = os.path.splitext(path)
+    ext = ext.lower()
+    text = document.text
+
+    chunks = None
+    language = None
+    if ext in PYTHON_EXTENSIONS:
+        chunks, language = python_chunks(text), "python"
+    elif ext in JS_EXTENSIONS:
+        chunks, language = js_chunks(text), "typescript" if ext in (".ts", ".tsx") else "javascript"
+
+    if not chunks:
+        nodes = sentence_splitter.get_nodes_from_documents([document])
+        for node in nodes:
+            node.excluded_embed_metadata_keys = EXCLUDED_EMBED_METADATA_KEYS
+        return nodes
+
+    lines = text.splitlines()
+    nodes = []
+    for chunk in sorted((part for chunk in chunks for part in split_long_chunk(chunk)), key=lambda c: c.start_line):
+        chunk_text = "\n".join(lines[chunk.start_line - 1:chunk.end_line])
+        if not chunk_text.strip():
+            continue
+        nodes.append(TextNode(
+            id_=f"{path}:{chunk.start_line}-{chunk.end_line}",
+            text=chunk_text,
+            metadata={
+                "file_path": path,
+                "symbol": chunk.symbol,
+                "kind": chunk.kind,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "language": language,
+            },
+            excluded_embed_metadata_keys=EXCLUDED_EMBED_METADATA_KEYS,
+            relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=document.id_)},
+        ))
+    return nodes
+
+
+def chunk_documents(documents: List[Document]) -> List[TextNode]:
+    return [node for document in documents for node in chunk_document(document)]
@@ -1,47 +1,75 @@
 import asyncio
+import hashlib
 import numpy as np
 import os
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List
-from llama_index.core import VectorStoreIndex, Document, Settings, get_response_synthesizer
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from llama_index.core import VectorStoreIndex, Document, get_response_synthesizer
 from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.embeddings.mistralai import MistralAIEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.mistralai import MistralAI
 from llama_index.llms.openai import OpenAI
-from config import AVAILABLE_MODELS
-from tools.utils import fetch_repo_files, fetch_file_content
+from config import AVAILABLE_MODELS, ARCHIVE_FETCH_THRESHOLD, EMBED_BATCH_SIZE, EMBEDDING_CACHE_ENABLED, INCREMENTAL_INDEXING, INDEX_TOP_FILES, LEXICAL_PATH_CANDIDATES, LOADED_INDEX_CACHE_SIZE, MODEL_CACHE_MODE, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CANDIDATES, RETRIEVAL_MODE, RETRIEVAL_TOKEN_BUDGET, RETRIEVAL_TOP_K, RRF_K
+from tools.cached_llm import CachedLLM
+from tools.chunking import chunk_documents
+from tools.embedding_cache import CachedEmbedding
+from tools.index_store import load_latest_repo_index, load_repo_index, manifest_files, new_storage_context, persist_repo_index
+from tools.lexical_index import BM25Index, mentioned_paths, path_tokens, reciprocal_rank_fusion, tokenize
+from tools.model_clients import shared_client
+from tools.tracing import RunTrace, annotate, check_cancelled, current_trace, span
+from tools.utils import fetch_repo_archive_files, fetch_repo_tree, fetch_file_content, resolve_commit_sha
 
 
 INCLUDE_FILE_EXTENSIONS = {".py", ".js", ".ts", ".json", ".md", ".txt"}
 
+# Embedding and LLM models per provider
+EMBEDDING_MODELS = {"mistral": "codestral-embed", "openai": "text-embedding-3-small"}
+LLM_MODELS = {"mistral": "codestral-latest", "openai": "gpt-4-turbo-preview"}
+
 def get_embedding_model(model_type: str):
-    """Get the appropriate embedding model based on the model type."""
+    """Get the shared embedding model for the model type, built once per process."""
     model_config = AVAILABLE_MODELS.get(model_type)
     if not model_config or not model_config["api_key"]:
         raise ValueError(f"Invalid model type or missing API key for {model_type}")
-    
-    if model_type == "mistral":
-        return MistralAIEmbedding(model_name="codestral-embed", api_key=model_config["api_key"])
-    elif model_type == "openai":
-        return OpenAIEmbedding(model="text-embedding-3-small", api_key=model_config["api_key"])
-    else:
+    if model_type not in EMBEDDING_MODELS:
         raise ValueError(f"Unsupported model type: {model_type}")
 
+    def build():
+        if model_type == "mistral":
+            embed_model = MistralAIEmbedding(model_name=EMBEDDING_MODELS[model_type], api_key=model_config["api_key"], embed_batch_size=EMBED_BATCH_SIZE)
+        else:
+            embed_model = OpenAIEmbedding(model=EMBEDDING_MODELS[model_type], api_key=model_config["api_key"], embed_batch_size=EMBED_BATCH_SIZE)
+        # Recorded runs need every vector on disk, so the embedding cache is also used when recording or replaying.
+        if EMBEDDING_CACHE_ENABLED or MODEL_CACHE_MODE != "off":
+            return CachedEmbedding(embed_model)
+        return embed_model
+
+    return shared_client("embedding", model_type, EMBEDDING_MODELS[model_type], model_config["api_key"], build)
+
 def get_llm_model(model_type: str):
-    """Get the appropriate LLM model based on the model type."""
+    """Get the shared LLM for the model type, built once per process."""
     model_config = AVAILABLE_MODELS.get(model_type)
     if not model_config or not model_config["api_key"]:
         raise ValueError(f"Invalid model type or missing API key for {model_type}")
-    
-    if model_type == "mistral":
-        return MistralAI(model="codestral-latest", api_key=model_config["api_key"])
-    elif model_type == "openai":
-        return OpenAI(model="gpt-4-turbo-preview", api_key=model_config["api_key"])
-    else:
+    if model_type not in LLM_MODELS:
         raise ValueError(f"Unsupported model type: {model_type}")
 
+    def build():
+        if model_type == "mistral":
+            llm = MistralAI(model=LLM_MODELS[model_type], api_key=model_config["api_key"])
+        else:
+            llm = OpenAI(model=LLM_MODELS[model_type], api_key=model_config["api_key"])
+        if MODEL_CACHE_MODE != "off":
+            return CachedLLM(llm)
+        return llm
+
+    return shared_client("llm", model_type, LLM_MODELS[model_type], model_config["api_key"], build)
+
 def safe_normalize(vec: np.ndarray) -> np.ndarray:
     vec = np.nan_to_num(vec, nan=0.0, posinf=0.0, neginf=0.0)
     norm = np.linalg.norm(vec)
@@ -49,37 +77,98 @@ def safe_normalize(vec: np.ndarray) -> np.ndarray:
         return None
     return vec / norm
 
-def select_relevant_files_semantic(issue_description: str, file_paths: List[str], model_type: str = "mistral") -> List[str]:
+# Recently used repo indexes by (model_type, owner, repo, commit_sha), shared by all runs in the process
+loaded_indexes: "OrderedDict[Tuple[str, str, str, str], Tuple[VectorStoreIndex, dict]]" = OrderedDict()
+loaded_indexes_lock = threading.Lock()
+index_locks = {}
+
+# BM25 index over the nodes of each loaded repo index, keyed by the index object, and the version
+# of each index, bumped whenever update_repo_index changes its nodes
+node_lexical_indexes = weakref.WeakKeyDictionary()
+index_versions = weakref.WeakKeyDictionary()
+node_lexical_lock = threading.Lock()
+
+# Memoized retrieve_context results by (owner, repo, commit_sha, model_type, mode, description hash),
+# and the computations in progress per event loop
+retrieval_results: "OrderedDict[tuple, str]" = OrderedDict()
+retrieval_in_flight = {}
+retrieval_results_lock = threading.Lock()
+
+def embed_paths(embed_model, file_paths: List[str], batch_size: int = EMBED_BATCH_SIZE) -> Tuple[List[str], np.ndarray]:
+    """
+    Embed file paths in batches. Repeated paths are served by the embedding model's on-disk cache.
+    Returns the paths that could be embedded and their embeddings as a float32 matrix (one row per path).
+    """
+    print(f"[Indexing] Embedding {len(file_paths)} file paths in batches of {batch_size}.")
+    vectors = {}
+    for start in range(0, len(file_paths), batch_size):
+        check_cancelled()
+        batch = file_paths[start:start + batch_size]
+        try:
+            embeddings = embed_model.get_text_embedding_batch(batch)
+        except Exception as e:
+            print(f"[Warning] Skipping {len(batch)} paths due to embedding error: {e}")
+            continue
+        for path, embedding in zip(batch, embeddings):
+            vectors[path] = np.asarray(embedding, dtype=np.float32)
+
+    embedded_paths = [path for path in file_paths if path in vectors]
+    if not embedded_paths:
+        return [], np.empty((0, 0), dtype=np.float32)
+    return embedded_paths, np.vstack([vectors[path] for path in embedded_paths])
+
+def lexical_path_candidates(issue_description: str, file_paths: List[str], limit: int = LEXICAL_PATH_CANDIDATES) -> Tuple[List[str], List[str]]:
+    """
+    Narrow the repository to at most `limit` paths with a BM25 pass over path tokens, before anything is embedded.
+    Returns (candidates, lexical ranking). Files named in the issue (e.g. traceback frames) come first;
+    when there are few lexical matches the candidates are filled up with the shallowest paths.
+    """
+    mentioned = mentioned_paths(issue_description, file_paths)
+    path_index = BM25Index([path_tokens(path) for path in file_paths])
+    lexical_ranking = [file_paths[doc_id] for doc_id, _ in path_index.top(tokenize(issue_description), limit)]
+
+    candidates = list(dict.fromkeys(mentioned + lexical_ranking))[:max(limit, len(mentioned))]
+    if len(candidates) < limit:
+        selected = set(candidates)
+        remaining = sorted((path for path in file_paths if path not in selected), key=lambda path: (path.count("/"), path))
+        candidates += remaining[:limit - len(candidates)]
+    print(f"[Indexing] Lexical pre-filter kept {len(candidates)} of {len(file_paths)} paths ({len(lexical_ranking)} matches, {len(mentioned)} mentioned).")
+    return candidates, list(dict.fromkeys(mentioned + lexical_ranking))
+
+def select_relevant_files_semantic(issue_description: str, file_paths: List[str], model_type: str = "mistral", top_k: int = 2) -> List[str]:
+    """
+    Pick the files most relevant to the issue: lexical candidates are embedded and ranked by
+    similarity, and both rankings are combined with reciprocal-rank fusion.
+    """
     embed_model = get_embedding_model(model_type)
+    candidates, lexical_ranking = lexical_path_candidates(issue_description, file_paths)
+    vector_ranking = []
 
-    issue_embedding = np.array(embed_model.get_text_embedding(issue_description), dtype=np.float64)
+    issue_embedding = np.array(embed_model.get_text_embedding(issue_description), dtype=np.float32)
     issue_embedding = safe_normalize(issue_embedding)
     if issue_embedding is None:
-        print("[Warning] Issue description embedding invalid (zero or NaN norm). Returning empty list.")
-        return []
+        print("[Warning] Issue description embedding invalid (zero or NaN norm). Using lexical ranking only.")
+        embedded_paths, path_matrix = [], None
+    else:
+        embedded_paths, path_matrix = embed_paths(embed_model, candidates)
 
-    scored_files = []
+    if embedded_paths:
+        path_matrix = np.nan_to_num(path_matrix, nan=0.0, posinf=0.0, neginf=0.0)
+        norms = np.linalg.norm(path_matrix, axis=1)
+        valid = norms > 0
+        if not valid.all():
+            print(f"[Warning] Skipping {int((~valid).sum())} paths due to zero or invalid embedding norm.")
 
-    for path in file_paths:
-        try:
-            file_embedding = np.array(embed_model.get_text_embedding(path), dtype=np.float64)
-            file_embedding = safe_normalize(file_embedding)
-            if file_embedding is None:
-                print(f"[Warning] Skipping {path} due to zero or invalid embedding norm.")
-                continue
-            
-            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
-                score = cosine_similarity([issue_embedding], [file_embedding])[0][0]
-
-            if np.isnan(score) or np.isinf(score):
-                print(f"[Warning] Skipping {path} due to invalid similarity score.")
-                continue
-
-            scored_files.append((path, score))
-        except Exception as e:
-            print(f"[Warning] Skipping {path} due to error: {e}")
+        scores = np.full(len(embedded_paths), -np.inf, dtype=np.float32)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            scores[valid] = (path_matrix[valid] / norms[valid, None]) @ issue_embedding
+        scores[~np.isfinite(scores)] = -np.inf
+
+        ranked = np.argsort(-scores, kind="stable")
+        vector_ranking = [embedded_paths[i] for i in ranked if np.isfinite(scores[i])]
 
-    top_files = [f[0] for f in sorted(scored_files, key=lambda x: x[1], reverse=True)[:2]]
+    fused = reciprocal_rank_fusion([lexical_ranking, vector_ranking], RRF_K)
+    top_files = [path for path, _ in fused[:top_k]]
 
     if "README.md" in file_paths:
         if "README.md" not in top_files:
@@ -100,55 +189,336 @@ async def async_retry_on_429(func, *args, max_retries=3, delay=1, **kwargs):
             else:
                 raise
 
-async def build_repo_index(owner: str, repo: str, ref: str = "main", issue_description: str = "", model_type: str = "mistral") -> VectorStoreIndex:
+async def fetch_documents(owner: str, repo: str, paths: List[str], ref: str) -> List[Document]:
+    """
+    Fetch file contents as Documents. Large batches are read from a single streamed
+    repository tarball; small ones, or a failed archive download, use the contents API.
+    """
+    if paths and len(paths) > ARCHIVE_FETCH_THRESHOLD:
+        try:
+            contents = await async_retry_on_429(fetch_repo_archive_files, owner, repo, paths, ref)
+            annotate(source="archive")
+            print(f"[Indexing] Extracted {len(contents)} of {len(paths)} files from repository archive.")
+            return [
+                Document(text=contents[path], metadata={"file_path": path}, id_=path)
+                for path in paths if path in contents
+            ]
+        except Exception as e:
+            print(f"[Warning] Archive download failed, falling back to per-file fetch: {e}")
+
+    async def fetch_document(path: str):
+        try:
+            content = await async_retry_on_429(fetch_file_content, owner, repo, path, ref)
+            print(f"[Indexing] Added file: {path}")
+            return Document(text=content, metadata={"file_path": path}, id_=path)
+        except Exception as e:
+            print(f"[Warning] Skipping file {path} due to error: {e}")
+            return None
+
+    annotate(source="contents")
+    # Requests run concurrently; the GitHub client bounds how many are in flight.
+    documents = await asyncio.gather(*(fetch_document(path) for path in paths))
+    return [document for document in documents if document is not None]
+
+def is_indexable(path: str) -> bool:
+    _, ext = os.path.splitext(path)
+    return ext.lower() in INCLUDE_FILE_EXTENSIONS
+
+def get_index_lock(key: Tuple[str, str, str, str]) -> asyncio.Lock:
+    """Lock serializing updates of one in-memory repo index on the running event loop."""
+    lock_key = (id(asyncio.get_running_loop()), key)
+    with loaded_indexes_lock:
+        if lock_key not in index_locks:
+            index_locks[lock_key] = asyncio.Lock()
+        return index_locks[lock_key]
+
+def remember_index(key: Tuple[str, str, str, str], index: VectorStoreIndex, manifest: dict):
+    """Keep a loaded index in memory so later calls for the same commit skip loading it from disk."""
+    with loaded_indexes_lock:
+        loaded_indexes[key] = (index, manifest)
+        loaded_indexes.move_to_end(key)
+        while len(loaded_indexes) > LOADED_INDEX_CACHE_SIZE:
+            loaded_indexes.popitem(last=False)
+
+async def build_repo_index(owner: str, repo: str, ref: str = "main", issue_description: str = "", model_type: str = "mistral", incremental: bool = INCREMENTAL_INDEXING, commit_sha: Optional[str] = None) -> VectorStoreIndex:
     embed_model = get_embedding_model(model_type)
     print(f"[Indexing] Starting to index repository: {owner}/{repo} at ref {ref}...")
 
-    file_paths = await async_retry_on_429(fetch_repo_files, owner, repo, ref)
+    if commit_sha is None:
+        commit_sha = await async_retry_on_429(resolve_commit_sha, owner, repo, ref)
+    key = (model_type, owner, repo, commit_sha)
+    with span("index.build", repo=f"{owner}/{repo}", commit_sha=commit_sha, model_type=model_type):
+        async with get_index_lock(key):
+            return await update_repo_index(owner, repo, ref, commit_sha, issue_description, model_type, embed_model, incremental)
 
-    if issue_description:
-        file_paths = select_relevant_files_semantic(issue_description, file_paths, model_type)
+async def update_repo_index(owner: str, repo: str, ref: str, commit_sha: str, issue_description: str, model_type: str, embed_model, incremental: bool) -> VectorStoreIndex:
+    key = (model_type, owner, repo, commit_sha)
+    tree = await async_retry_on_429(fetch_repo_tree, owner, repo, commit_sha)
 
-    documents = []
+    with loaded_indexes_lock:
+        index, manifest = loaded_indexes.get(key, (None, None))
+    if index is None:
+        index, manifest = await asyncio.to_thread(load_repo_index, owner, repo, commit_sha, model_type, embed_model)
+        if index is not None:
+            print(f"[Indexing] Loaded stored index for {owner}/{repo}@{commit_sha[:12]} ({len(manifest_files(manifest))} files).")
+    indexed_files = manifest_files(manifest)
+    stale_files = []
+    if index is None and incremental:
+        index, manifest = await asyncio.to_thread(load_latest_repo_index, owner, repo, model_type, embed_model)
+        indexed_files = manifest_files(manifest)
+        if index is not None:
+            base_sha = manifest.get("commit_sha", "")
+            deleted_files = [path for path in indexed_files if path not in tree]
+            stale_files = [path for path, blob_sha in indexed_files.items() if path in tree and blob_sha != tree[path]]
+            print(
+                f"[Indexing] Updating stored index from {base_sha[:12]}: "
+                f"{len(stale_files)} changed, {len(deleted_files)} deleted."
+            )
+            for path in deleted_files + stale_files:
+                await asyncio.to_thread(index.delete_ref_doc, path, delete_from_docstore=True)
+                indexed_files.pop(path)
+            if deleted_files or stale_files:
+                bump_index_version(index)
 
-    for path in file_paths:
-        _, ext = os.path.splitext(path)
-        if ext.lower() not in INCLUDE_FILE_EXTENSIONS:
-            continue
+    file_paths = list(tree.keys())
 
-        try:
-            content = await async_retry_on_429(fetch_file_content, owner, repo, path, ref)
-            documents.append(Document(text=content, metadata={"file_path": path}))
-            print(f"[Indexing] Added file: {path}")
-            await asyncio.sleep(0.1)
-        except Exception as e:
-            print(f"[Warning] Skipping file {path} due to error: {e}")
+    if issue_description and not all(path in indexed_files for path in file_paths if is_indexable(path)):
+        with span("index.select_files", repo=f"{owner}/{repo}", paths=len(file_paths)):
+            file_paths = await asyncio.to_thread(select_relevant_files_semantic, issue_description, file_paths, model_type, INDEX_TOP_FILES)
+
+    paths_to_fetch = [
+        path for path in dict.fromkeys(stale_files + file_paths)
+        if is_indexable(path) and path not in indexed_files
+    ]
+
+    with span("index.fetch_files", repo=f"{owner}/{repo}", requested=len(paths_to_fetch)) as fetch_span:
+        documents = await fetch_documents(owner, repo, paths_to_fetch, commit_sha)
+        fetch_span.set(files=len(documents), bytes=sum(len(document.text.encode("utf-8")) for document in documents))
+    nodes = chunk_documents(documents)
+
+    if index is not None and not documents and manifest.get("commit_sha") == commit_sha:
+        print("[Indexing] Reusing stored index, all selected files already indexed.")
+        annotate(cache_hits=1)
+        remember_index(key, index, manifest)
+        return index
 
     try:
-        index = await async_retry_on_429(VectorStoreIndex.from_documents, documents, embed_model=embed_model)
+        if index is None:
+            index = await async_retry_on_429(asyncio.to_thread, VectorStoreIndex, nodes, embed_model=embed_model, storage_context=new_storage_context())
+        else:
+            await asyncio.to_thread(index.insert_nodes, nodes)
+            bump_index_version(index)
     except Exception as e:
         print(f"[Error] Failed to build index due to: {e}")
         raise
 
-    print(f"[Indexing] Finished indexing {len(documents)} files.")
+    for document in documents:
+        path = document.metadata["file_path"]
+        indexed_files[path] = tree[path]
+    manifest = {"ref": ref, "commit_sha": commit_sha, "files": indexed_files}
+    try:
+        await asyncio.to_thread(persist_repo_index, index, owner, repo, commit_sha, model_type, manifest)
+    except Exception as e:
+        print(f"[Warning] Failed to persist index for {owner}/{repo}@{commit_sha[:12]}: {e}")
+    remember_index(key, index, manifest)
+
+    annotate(cache_misses=1, files=len(documents), chunks=len(nodes))
+    print(f"[Indexing] Finished indexing {len(documents)} files ({len(nodes)} chunks).")
     return index
 
 
-async def retrieve_context(owner: str, repo: str, ref: str, issue_description: str, model_type: str = "mistral") -> List[str]:
-    index = await build_repo_index(owner, repo, ref, issue_description, model_type)
-    
-    # Set the LLM and embedding model based on the selected model type
-    Settings.llm = get_llm_model(model_type)
-    Settings.embed_model = get_embedding_model(model_type)
+def bump_index_version(index: VectorStoreIndex):
+    """Mark the nodes of an index as changed, so its BM25 index is rebuilt on the next retrieval."""
+    with node_lexical_lock:
+        index_versions[index] = index_versions.get(index, 0) + 1
+
+def get_node_lexical_index(index: VectorStoreIndex) -> Tuple[List[str], BM25Index]:
+    """
+    BM25 index over the content, symbols and paths of an index's nodes. It is cached per index
+    version, so the docstore is only read when the nodes changed since the last build.
+    """
+    with node_lexical_lock:
+        version = index_versions.get(index, 0)
+        cached = node_lexical_indexes.get(index)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+    node_ids, documents = [], []
+    for node_id, node in index.docstore.docs.items():
+        tokens = tokenize(node.get_content())
+        tokens += path_tokens(node.metadata.get("file_path", ""))
+        tokens += tokenize(node.metadata.get("symbol", ""))
+        node_ids.append(node_id)
+        documents.append(tokens)
+    lexical_index = BM25Index(documents)
+    with node_lexical_lock:
+        # Built from the version read above; a concurrent update bumps past it and forces a rebuild.
+        node_lexical_indexes[index] = (version, node_ids, lexical_index)
+    return node_ids, lexical_index
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever combining vector similarity with BM25 over node content by reciprocal-rank fusion.
+    Vector matches below `similarity_cutoff` are dropped; lexical matches always take part, so
+    exact identifiers from the issue are found even when their embedding is not close.
+    """
+
+    def __init__(self, index: VectorStoreIndex, lexical_query: Optional[str] = None, top_k: int = 3, candidates: int = RETRIEVAL_CANDIDATES, similarity_cutoff: float = 0.75):
+        self.index = index
+        self.lexical_query = lexical_query
+        self.top_k = top_k
+        self.candidates = candidates
+        self.similarity_cutoff = similarity_cutoff
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_results = self.index.as_retriever(similarity_top_k=self.candidates).retrieve(query_bundle)
+        node_ids, lexical_index = get_node_lexical_index(self.index)
+        lexical_hits = lexical_index.top(tokenize(self.lexical_query or query_bundle.query_str), self.candidates)
+
+        lexical_ranking = [node_ids[doc_id] for doc_id, _ in lexical_hits]
+        vector_ranking = [
+            result.node.node_id for result in vector_results
+            if result.score is not None and result.score >= self.similarity_cutoff
+        ]
+        nodes = {result.node.node_id: result.node for result in vector_results}
+        similarities = {result.node.node_id: result.score for result in vector_results}
+
+        # Results are ordered by the fused rank, but scored with their vector similarity (None for
+        # lexical-only matches): reciprocal-rank-fusion scores are tiny and would read as irrelevance.
+        results = []
+        for node_id, _ in reciprocal_rank_fusion([lexical_ranking, vector_ranking], RRF_K)[:self.top_k]:
+            node = nodes.get(node_id) or self.index.docstore.get_node(node_id)
+            results.append(NodeWithScore(node=node, score=similarities.get(node_id)))
+        return results
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting context."""
+    return len(text) // 4 + 1
+
+def format_retrieved_nodes(results: List[NodeWithScore], token_budget: int = RETRIEVAL_TOKEN_BUDGET) -> str:
+    """
+    Format ranked nodes as code blocks headed by file path, line range, symbol and vector similarity,
+    best first, stopping (and truncating the last block) when the token budget is used up.
+    """
+    if not results:
+        return "No relevant code found in the repository for this issue."
+
+    blocks = []
+    remaining = token_budget
+    for result in results:
+        metadata = result.node.metadata
+        location = metadata.get("file_path", "unknown")
+        if metadata.get("start_line"):
+            location += f":{metadata['start_line']}-{metadata['end_line']}"
+        details = [metadata["symbol"]] if metadata.get("symbol") else []
+        details.append(f"similarity {result.score:.3f}" if result.score is not None else "lexical match")
+        header = f"### {location} ({', '.join(details)})"
+        text = result.node.get_content()
+
+        available = remaining - estimate_tokens(header) - 4
+        if available <= 0:
+            break
+        if estimate_tokens(text) > available:
+            text = text[:available * 4].rstrip() + "\n... (truncated)"
+        block = f"{header}\n```{metadata.get('language', '')}\n{text}\n```"
+        blocks.append(block)
+        remaining -= estimate_tokens(block)
+
+    omitted = len(results) - len(blocks)
+    if omitted:
+        blocks.append(f"({omitted} more matches omitted to stay within the context budget.)")
+    return "\n\n".join(blocks)
+
+def normalized_description_hash(issue_description: str) -> str:
+    """Hash of the issue text ignoring case and whitespace differences."""
+    normalized = " ".join((issue_description or "").lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+async def retrieve_context(owner: str, repo: str, ref: str, issue_description: str, model_type: str = "mistral", mode: str = RETRIEVAL_MODE) -> str:
+    """
+    Find the code relevant to an issue. In "raw" mode the ranked chunks are returned directly,
+    with path, line range and score, so the agent reads the actual code without an extra LLM call;
+    "synthesize" mode has the LLM summarize the retrieved chunks first.
+
+    Results are memoized per commit and normalized issue text, and concurrent identical
+    calls share a single computation.
+    """
+    with span("index.query", repo=f"{owner}/{repo}", mode=mode, model_type=model_type):
+        return await memoized_context(owner, repo, ref, issue_description, model_type, mode)
+
+async def memoized_context(owner: str, repo: str, ref: str, issue_description: str, model_type: str, mode: str) -> str:
+    commit_sha = await async_retry_on_429(resolve_commit_sha, owner, repo, ref)
+    key = (owner.lower(), repo.lower(), commit_sha, model_type, mode, normalized_description_hash(issue_description))
+    loop = asyncio.get_running_loop()
+    flight_key = (id(loop), key)
+
+    with retrieval_results_lock:
+        if key in retrieval_results:
+            retrieval_results.move_to_end(key)
+            print(f"[Retrieval] Reusing result for {owner}/{repo}@{commit_sha[:12]}.")
+            annotate(cache_hits=1)
+            return retrieval_results[key]
+        task = retrieval_in_flight.get(flight_key)
+        leader = task is None
+        if leader:
+            shared_trace = RunTrace(shared_retrieval=f"{owner}/{repo}")
+            task = loop.create_task(shared_context(flight_key, key, shared_trace, owner, repo, ref, commit_sha, issue_description, model_type, mode))
+            # Mark the outcome as retrieved so a failure without waiters is not reported as unhandled.
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            retrieval_in_flight[flight_key] = task
+
+    if not leader:
+        print(f"[Retrieval] Waiting for identical retrieval in progress for {owner}/{repo}@{commit_sha[:12]}.")
+        annotate(cache_hits=1, shared=True)
+        # Shielded so a waiter being cancelled or timing out does not cancel the shared computation.
+        return await asyncio.shield(task)
+
+    annotate(cache_misses=1)
+    run_trace = current_trace.get()
+    context = await asyncio.shield(task)
+    if run_trace is not None:
+        # The shared computation records its spans in its own trace; report them for the run that started it.
+        for record in shared_trace.spans:
+            run_trace.add(record)
+    return context
+
+async def shared_context(flight_key: tuple, key: tuple, trace: RunTrace, owner: str, repo: str, ref: str, commit_sha: str, issue_description: str, model_type: str, mode: str) -> str:
+    """
+    compute_context as a task detached from the runs waiting for it. It has its own trace, so
+    cancelling the run that started it neither stops it (check_cancelled) nor fails the others.
+    """
+    current_trace.set(trace)
+    try:
+        context = await compute_context(owner, repo, ref, commit_sha, issue_description, model_type, mode)
+        with retrieval_results_lock:
+            retrieval_results[key] = context
+            while len(retrieval_results) > RETRIEVAL_CACHE_SIZE:
+                retrieval_results.popitem(last=False)
+        return context
+    finally:
+        with retrieval_results_lock:
+            retrieval_in_flight.pop(flight_key, None)
+
+async def compute_context(owner: str, repo: str, ref: str, commit_sha: str, issue_description: str, model_type: str, mode: str) -> str:
+    index = await build_repo_index(owner, repo, ref, issue_description, model_type, commit_sha=commit_sha)
+
+    if mode == "raw":
+        retriever = HybridRetriever(index, lexical_query=issue_description, top_k=RETRIEVAL_TOP_K)
+        with span("index.retrieve", mode=mode) as retrieve_span:
+            results = await asyncio.to_thread(retriever.retrieve, issue_description)
+            retrieve_span.set(chunks=len(results))
+        context = format_retrieved_nodes(results)
+        print(f"[Retrieval] Returning {len(results)} chunks (~{estimate_tokens(context)} tokens).")
+        return context
 
-    retriever = index.as_retriever(similarity_top_k=3)
+    # The models are passed explicitly instead of through the global Settings, which concurrent
+    # requests would race on; the index already queries with its own embedding model.
+    retriever = HybridRetriever(index, lexical_query=issue_description)
 
     query_engine = RetrieverQueryEngine(
         retriever=retriever,
-        response_synthesizer=get_response_synthesizer(),
-        node_postprocessors=[
-            SimilarityPostprocessor(similarity_top_k=3, similarity_cutoff=0.75)
-        ],
+        response_synthesizer=get_response_synthesizer(llm=get_llm_model(model_type)),
     )
 
     query = (
@@ -160,7 +530,8 @@ async def retrieve_context(owner: str, repo: str, ref: str, issue_description: s
         "- DO NOT include generic, loosely related, or unrelated content.\n"
     )
 
-    response = await asyncio.to_thread(query_engine.query, query)
+    with span("index.retrieve", mode=mode):
+        response = await asyncio.to_thread(query_engine.query, query)
 
     print(response)
-    return response
\ No newline at end of file
+    return str(response)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from config import EMBEDDING_CACHE_DIR, MODEL_CACHE_MODE
+from tools.tracing import annotate, check_cancelled, span
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+# One index record per cached vector: SHA-256 digest of the key, row in the vector file.
+INDEX_RECORD = struct.Struct("<32sQ")
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+
+def text_key(text: str, kind: str = "text") -> bytes:
+    """Content-addressed cache key for a piece of text."""
+    return hashlib.sha256(f"{kind}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only, content-addressed store of float32 embedding vectors for a single model.
+
+    Vectors live in a flat float32 file that is read through a memory map, and a compact
+    binary index maps key digests to rows. Writers append under a file lock, vectors first
+    and index records second, so several processes can share one cache directory and
+    readers only ever see rows that are fully written.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]", "_", model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.cache_dir, VECTORS_FILE)
+        self.index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        self.meta_path = os.path.join(self.cache_dir, META_FILE)
+        self.lock_path = os.path.join(self.cache_dir, LOCK_FILE)
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._index_offset = 0
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_dim(self) -> Optional[int]:
+        if self._dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self._dim = int(json.load(f)["dim"])
+        return self._dim
+
+    def _refresh_index(self):
+        """Read index records appended since the last refresh, possibly by other processes."""
+        if not os.path.exists(self.index_path):
+            return
+        size = os.path.getsize(self.index_path)
+        if size <= self._index_offset:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read(size - self._index_offset)
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        for digest, row in INDEX_RECORD.iter_unpack(data[:usable]):
+            self._rows[digest] = row
+        self._index_offset += usable
+
+    def _vector_rows(self, min_rows: int) -> np.memmap:
+        if self._vectors is None or self._vectors.shape[0] < min_rows:
+            rows = os.path.getsize(self.vectors_path) // (self._dim * 4)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+        return self._vectors
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[List[float]]]:
+        """Return the cached vector for every key, or None where the key is not cached."""
+        with self._lock:
+            self._refresh_index()
+            rows = [self._rows.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            self.hits += len(found)
+            self.misses += len(rows) - len(found)
+            if not found or self._load_dim() is None:
+                return [None] * len(keys)
+            vectors = self._vector_rows(max(found) + 1)
+            return [vectors[row].tolist() if row is not None else None for row in rows]
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]):
+        """Append vectors for keys that are not cached yet."""
+        if not keys:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock, self._file_lock():
+            if self._load_dim() is None:
+                self._dim = int(matrix.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model_name": self.model_name, "dim": self._dim}, f)
+            if matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match cached dimension {self._dim} for {self.model_name}"
+                )
+
+            self._refresh_index()
+            new_rows = {}
+            for key, vector in zip(keys, matrix):
+                if key not in self._rows and key not in new_rows:
+                    new_rows[key] = vector
+            if not new_rows:
+                return
+
+            row_bytes = self._dim * 4
+            start_row = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+            # Seek to the last complete row so an interrupted write never misaligns later rows.
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                f.seek(start_row * row_bytes)
+                f.write(np.stack(list(new_rows.values())).tobytes())
+                f.truncate()
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(
+                    INDEX_RECORD.pack(key, start_row + i) for i, key in enumerate(new_rows)
+                ))
+
+
+embedding_caches: Dict[str, EmbeddingCache] = {}
+embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Return the process-wide embedding cache for a model."""
+    with embedding_caches_lock:
+        if model_name not in embedding_caches:
+            embedding_caches[model_name] = EmbeddingCache(model_name)
+        return embedding_caches[model_name]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated texts from an EmbeddingCache."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: Optional[EmbeddingCache] = None, **kwargs):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._cache = cache or get_embedding_cache(inner.model_name)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _lookup(self, texts: List[str], kind: str):
+        # Every batch starts here, so a cancelled run stops before its next provider request.
+        check_cancelled()
+        keys = [text_key(text, kind) for text in texts]
+        cached = self._cache.get_many(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        annotate(cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+        if missing and MODEL_CACHE_MODE == "replay":
+            raise Exception(f"No recorded embedding for {len(missing)} of {len(texts)} texts (MODEL_CACHE_MODE=replay)")
+        return keys, cached, missing
+
+    def _store(self, keys, cached, missing, embeddings) -> List[List[float]]:
+        self._cache.put_many([keys[i] for i in missing], embeddings)
+        for i, embedding in zip(missing, embeddings):
+            cached[i] = embedding
+        return cached
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        with span("embedding.batch", model=self.model_name, kind="query", texts=1):
+            keys, cached, missing = self._lookup([query], "query")
+            if missing:
+                return self._store(keys, cached, missing, [self._inner._get_query_embedding(query)])[0]
+            return cached[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        with span("embedding.batch", model=self.model_name, kind="query", texts=1):
+            keys, cached, missing = self._lookup([query], "query")
+            if missing:
+                return self._store(keys, cached, missing, [await self._inner._aget_query_embedding(query)])[0]
+            return cached[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.batch", model=self.model_name, kind="text", texts=len(texts)):
+            keys, cached, missing = self._lookup(texts, "text")
+            if missing:
+                embeddings = self._inner._get_text_embeddings([texts[i] for i in missing])
+                return self._store(keys, cached, missing, embeddings)
+            return cached
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.batch", model=self.model_name, kind="text", texts=len(texts)):
+            keys, cached, missing = self._lookup(texts, "text")
+            if missing:
+                embeddings = await self._inner._aget_text_embeddings([texts[i] for i in missing])
+                return self._store(keys, cached, missing, embeddings)
+            return cached
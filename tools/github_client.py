@@ -0,0 +1,91 @@
+import asyncio
+import weakref
+from typing import Optional
+from urllib.parse import urlparse
+import httpx
+from config import GITHUB_MAX_CONCURRENCY, GITHUB_REQUEST_TIMEOUT
+from tools.http_cache import cache_key, conditional_headers, revalidated_headers, store_response, touch_response
+from tools.rate_limit import PRIORITY_DEFAULT, rate_limit_scheduler, request_bucket
+from tools.tracing import annotate, span
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# One pooled client and concurrency window per event loop, since neither can be shared across loops.
+async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the (client, semaphore) pair for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    state = async_clients.get(loop)
+    if state is None:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=True,
+            timeout=GITHUB_REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=GITHUB_MAX_CONCURRENCY,
+                max_keepalive_connections=GITHUB_MAX_CONCURRENCY,
+            ),
+        )
+        state = (client, asyncio.Semaphore(GITHUB_MAX_CONCURRENCY))
+        async_clients[loop] = state
+    return state
+
+
+async def close_async_client():
+    """Close the pooled client of the running event loop."""
+    state = async_clients.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
+
+
+def annotate_github_response(response, cacheable: bool, revalidated: bool, streamed: bool = False):
+    """Add status, size, HTTP cache outcome and remaining rate limit of a response to the current span."""
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    annotate(
+        status_code=response.status_code,
+        rate_limit_remaining=int(remaining) if remaining and remaining.isdigit() else None,
+    )
+    if not streamed:
+        annotate(bytes=len(response.content))
+    if cacheable:
+        annotate(cache_hits=int(revalidated), cache_misses=int(not revalidated))
+
+
+async def github_request_async(method: str, url: str, headers: dict, bucket: Optional[str] = None, priority: int = PRIORITY_DEFAULT, **kwargs) -> httpx.Response:
+    """
+    Send a GitHub API request over the shared keep-alive connection pool.
+    At most GITHUB_MAX_CONCURRENCY requests are in flight per event loop, requests wait on the
+    shared rate-limit scheduler without blocking the loop, and cacheable GET requests are
+    revalidated against the HTTP cache with ETag/Last-Modified.
+    """
+    client, semaphore = get_async_client()
+    bucket = bucket or request_bucket(headers)
+    key = cache_key(method, url, headers)
+    with span("github.request", method=method, path=urlparse(url).path, bucket=bucket):
+        cached, headers = await asyncio.to_thread(conditional_headers, key, headers)
+        while True:
+            await rate_limit_scheduler.acquire(bucket, priority)
+            async with semaphore:
+                response = await client.request(method, url, headers=headers, **kwargs)
+            if rate_limit_scheduler.update(bucket, response):
+                continue
+
+            revalidated = response.status_code == 304 and cached is not None
+            annotate_github_response(response, key is not None, revalidated)
+            if revalidated:
+                await asyncio.to_thread(touch_response, key)
+                return httpx.Response(
+                    200,
+                    headers=revalidated_headers(cached, response.headers),
+                    content=cached["body"],
+                    request=response.request,
+                )
+            if key is not None:
+                await asyncio.to_thread(store_response, key, response.status_code, response.headers, response.content)
+            return response
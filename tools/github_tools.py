@@ -1,5 +1,9 @@
+import asyncio
 from urllib.parse import urlparse
-from tools.utils import get_installation_id, get_installation_token, github_request
+from config import GITHUB_API_URL
+from tools.github_client import github_request_async
+from tools.rate_limit import PRIORITY_INTERACTIVE
+from tools.utils import check_installation_response, get_installation_id, get_installation_token, github_request, installation_bucket
 
 def fetch_github_issue(issue_url):
     parsed = urlparse(issue_url)
@@ -16,29 +20,98 @@ def fetch_github_issue(issue_url):
 def get_issue_details(owner, repo, issue_num):
     installation_id = get_installation_id(owner, repo)
     token = get_installation_token(installation_id)
-    url = f"https://api.github.com/repos/{owner}/{repo}/issues/{issue_num}"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues/{issue_num}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github.v3+json"
     }
-    response = github_request("GET", url, headers=headers)
+    response = github_request("GET", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_INTERACTIVE)
     if response.status_code == 200:
-        return response.json().get("body")
+        issue = response.json()
+        return {"title": issue.get("title") or "", "body": issue.get("body") or ""}
     else:
+        check_installation_response(owner, repo, response)
         raise Exception(f"Failed to fetch issue: {response.status_code} {response.text}")
 
 
 def post_comment(owner, repo, issue_num, comment_body):
     installation_id = get_installation_id(owner, repo)
     token = get_installation_token(installation_id)
-    url = f"https://api.github.com/repos/{owner}/{repo}/issues/{issue_num}/comments"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues/{issue_num}/comments"
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github.v3+json"
     }
     data = {"body": comment_body}
-    response = github_request("POST", url, headers=headers, json=data)
+    response = github_request("POST", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_INTERACTIVE, json=data)
     if response.status_code == 201:
         return response.json()
     else:
+        check_installation_response(owner, repo, response)
         raise Exception(f"Failed to post comment: {response.status_code} {response.text}")
+
+
+async def get_issue_details_async(owner, repo, issue_num):
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+    token = await asyncio.to_thread(get_installation_token, installation_id)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues/{issue_num}"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    response = await github_request_async(
+        "GET", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_INTERACTIVE
+    )
+    if response.status_code == 200:
+        issue = response.json()
+        return {"title": issue.get("title") or "", "body": issue.get("body") or ""}
+    else:
+        check_installation_response(owner, repo, response)
+        raise Exception(f"Failed to fetch issue: {response.status_code} {response.text}")
+
+
+async def post_comment_async(owner, repo, issue_num, comment_body):
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+    token = await asyncio.to_thread(get_installation_token, installation_id)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues/{issue_num}/comments"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    data = {"body": comment_body}
+    response = await github_request_async(
+        "POST", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_INTERACTIVE, json=data
+    )
+    if response.status_code == 201:
+        return response.json()
+    else:
+        check_installation_response(owner, repo, response)
+        raise Exception(f"Failed to post comment: {response.status_code} {response.text}")
+
+
+async def list_issues_async(owner, repo, state="open", labels=None):
+    """List the issues of a repository (pull requests excluded), following pagination."""
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+    token = await asyncio.to_thread(get_installation_token, installation_id)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    params = {"state": state, "per_page": 100, "page": 1}
+    if labels:
+        params["labels"] = ",".join(labels)
+
+    issues = []
+    while True:
+        response = await github_request_async(
+            "GET", url, headers=headers, bucket=installation_bucket(installation_id), params=params
+        )
+        if response.status_code != 200:
+            check_installation_response(owner, repo, response)
+            raise Exception(f"Failed to list issues: {response.status_code} {response.text}")
+        page = response.json()
+        issues.extend(issue for issue in page if "pull_request" not in issue)
+        if len(page) < params["per_page"]:
+            return issues
+        params["page"] += 1
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import HTTP_CACHE_ENABLED, HTTP_CACHE_MAX_ENTRIES, HTTP_CACHE_PATH
+
+
+# Read-only endpoints worth revalidating: trees, contents, commits, issues and installation lookups.
+CACHEABLE_URL_PATTERN = re.compile(
+    r"/repos/[^/]+/[^/]+/(git/trees/|contents/|commits/|issues/\d+$|installation$)|/orgs/[^/]+/installation$"
+)
+
+cache_lock = threading.Lock()
+cache_connection = None
+
+
+def get_connection() -> sqlite3.Connection:
+    global cache_connection
+    if cache_connection is None:
+        directory = os.path.dirname(HTTP_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        cache_connection = sqlite3.connect(HTTP_CACHE_PATH, check_same_thread=False, timeout=30)
+        cache_connection.execute("PRAGMA journal_mode=WAL")
+        cache_connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "headers TEXT NOT NULL, body BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        cache_connection.execute("CREATE INDEX IF NOT EXISTS responses_updated_at ON responses (updated_at)")
+        cache_connection.commit()
+    return cache_connection
+
+
+def cache_key(method: str, url: str, headers: Optional[Dict]) -> Optional[str]:
+    """Return the cache key of a request, or None if the request is not cacheable."""
+    if not HTTP_CACHE_ENABLED or method.upper() != "GET":
+        return None
+    path = url.split("?", 1)[0]
+    if not CACHEABLE_URL_PATTERN.search(path):
+        return None
+    accept = (headers or {}).get("Accept", "")
+    return f"GET {url} {accept}"
+
+
+def conditional_headers(key: Optional[str], headers: Optional[Dict]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    Look up a cached response and add If-None-Match / If-Modified-Since validators to the headers.
+    Returns (cached entry or None, request headers).
+    """
+    if key is None:
+        return None, headers
+    with cache_lock:
+        row = get_connection().execute(
+            "SELECT etag, last_modified, headers, body FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return None, headers
+
+    etag, last_modified, cached_headers, body = row
+    headers = dict(headers or {})
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return {"headers": json.loads(cached_headers), "body": body}, headers
+
+
+def store_response(key: Optional[str], status_code: int, headers, body: bytes):
+    """Store a successful response that carries an ETag or Last-Modified validator."""
+    if key is None or status_code != 200:
+        return
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+
+    kept_headers = {
+        name.lower(): value for name, value in headers.items()
+        if name.lower() in ("content-type", "etag", "last-modified")
+    }
+    with cache_lock:
+        connection = get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, etag, last_modified, headers, body, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, etag, last_modified, json.dumps(kept_headers), body, time.time()),
+        )
+        connection.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (HTTP_CACHE_MAX_ENTRIES,),
+        )
+        connection.commit()
+
+
+def revalidated_headers(cached: Dict, not_modified_headers) -> Dict:
+    """Merge the headers of a 304 response (rate limits, fresh validators) into the cached ones."""
+    headers = dict(cached["headers"])
+    for name, value in not_modified_headers.items():
+        if name.lower() not in ("content-length", "content-encoding", "transfer-encoding"):
+            headers[name.lower()] = value
+    return headers
+
+
+def touch_response(key: str):
+    """Mark a cached response as recently revalidated so it is kept over stale entries."""
+    with cache_lock:
+        connection = get_connection()
+        connection.execute("UPDATE responses SET updated_at = ? WHERE key = ?", (time.time(), key))
+        connection.commit()
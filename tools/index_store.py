@@ -0,0 +1,206 @@
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional, Tuple
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from config import INDEX_KEEP_COMMITS, INDEX_STORE_DIR, VECTOR_STORE
+from tools.vector_store import QuantizedVectorStore, is_quantized_store
+
+
+MANIFEST_FILE = "manifest.json"
+VECTOR_STORE_FILE = "default__vector_store.json"
+# How often and how long a load waits while another process replaces the index directory
+REPLACE_RETRIES = 5
+REPLACE_RETRY_DELAY = 0.1
+
+
+def get_index_dir(owner: str, repo: str, commit_sha: str, model_type: str) -> str:
+    """Return the directory a repo index is persisted to for a given commit and embedding model."""
+    return os.path.join(INDEX_STORE_DIR, model_type, owner, repo, commit_sha)
+
+
+def load_manifest(index_dir: str) -> Optional[Dict]:
+    """Load the manifest describing a persisted index, or None if it does not exist."""
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Warning] Ignoring unreadable index manifest {manifest_path}: {e}")
+        return None
+
+
+def find_latest_index_dir(owner: str, repo: str, model_type: str) -> Optional[str]:
+    """Return the most recently updated persisted index directory for owner/repo, if any."""
+    repo_dir = os.path.join(INDEX_STORE_DIR, model_type, owner, repo)
+    if not os.path.isdir(repo_dir):
+        return None
+
+    latest_dir, latest_updated = None, -1
+    for name in os.listdir(repo_dir):
+        if ".tmp-" in name or ".old-" in name:
+            continue
+        index_dir = os.path.join(repo_dir, name)
+        manifest = load_manifest(index_dir)
+        if manifest and manifest.get("updated_at", 0) > latest_updated:
+            latest_dir, latest_updated = index_dir, manifest.get("updated_at", 0)
+    return latest_dir
+
+
+def manifest_files(manifest: Optional[Dict]) -> Dict[str, Optional[str]]:
+    """Return the indexed files of a manifest as a mapping of path to blob SHA."""
+    if not manifest:
+        return {}
+    files = manifest.get("files", {})
+    if isinstance(files, list):
+        # Manifests written before blob SHAs were tracked only list the paths.
+        return {path: None for path in files}
+    return dict(files)
+
+
+def new_storage_context() -> StorageContext:
+    """Storage for a newly built index, with the vector store selected by VECTOR_STORE."""
+    if VECTOR_STORE == "quantized":
+        return StorageContext.from_defaults(vector_store=QuantizedVectorStore())
+    return StorageContext.from_defaults()
+
+
+def load_repo_index(owner: str, repo: str, commit_sha: str, model_type: str, embed_model) -> Tuple[Optional[VectorStoreIndex], Optional[Dict]]:
+    """
+    Load the persisted index for owner/repo at a commit SHA.
+    Returns (index, manifest), or (None, None) when nothing usable is stored.
+    """
+    return load_index_dir(get_index_dir(owner, repo, commit_sha, model_type), embed_model)
+
+
+def load_latest_repo_index(owner: str, repo: str, model_type: str, embed_model) -> Tuple[Optional[VectorStoreIndex], Optional[Dict]]:
+    """Load the most recently updated persisted index for owner/repo at any commit."""
+    index_dir = find_latest_index_dir(owner, repo, model_type)
+    if index_dir is None:
+        return None, None
+    return load_index_dir(index_dir, embed_model)
+
+
+def is_being_replaced(index_dir: str) -> bool:
+    """Whether another writer has renamed index_dir aside and is about to move its new version in."""
+    return bool(glob.glob(glob.escape(index_dir) + ".old-*"))
+
+
+def load_index_dir(index_dir: str, embed_model) -> Tuple[Optional[VectorStoreIndex], Optional[Dict]]:
+    """
+    Load a persisted index and its manifest from a directory. While another process is replacing
+    the directory (see replace_dir), the load is retried briefly instead of reporting no index.
+    """
+    for attempt in range(REPLACE_RETRIES):
+        index, manifest = load_index_dir_once(index_dir, embed_model, quiet=attempt < REPLACE_RETRIES - 1)
+        if index is not None or not is_being_replaced(index_dir):
+            return index, manifest
+        time.sleep(REPLACE_RETRY_DELAY)
+    return None, None
+
+
+def load_index_dir_once(index_dir: str, embed_model, quiet: bool = False) -> Tuple[Optional[VectorStoreIndex], Optional[Dict]]:
+    manifest = load_manifest(index_dir)
+    if manifest is None:
+        return None, None
+
+    try:
+        vector_store_path = os.path.join(index_dir, VECTOR_STORE_FILE)
+        if is_quantized_store(vector_store_path):
+            vector_store = QuantizedVectorStore.from_persist_path(vector_store_path)
+            storage_context = StorageContext.from_defaults(persist_dir=index_dir, vector_store=vector_store)
+        else:
+            # Indexes persisted with the default SimpleVectorStore keep loading as they are.
+            storage_context = StorageContext.from_defaults(persist_dir=index_dir)
+        index = load_index_from_storage(storage_context, embed_model=embed_model)
+    except Exception as e:
+        if not (quiet and is_being_replaced(index_dir)):
+            print(f"[Warning] Failed to load stored index from {index_dir}: {e}")
+        return None, None
+
+    return index, manifest
+
+
+def persist_repo_index(index: VectorStoreIndex, owner: str, repo: str, commit_sha: str, model_type: str, manifest: Dict) -> str:
+    """
+    Persist an index and its manifest for owner/repo at a commit SHA.
+    The index is written to a temporary directory first and then moved into place,
+    so readers never see a half-written index. Afterwards only the INDEX_KEEP_COMMITS
+    most recently updated commits of the repo are kept.
+    """
+    index_dir = get_index_dir(owner, repo, commit_sha, model_type)
+    suffix = f"{os.getpid()}-{int(time.time() * 1000)}"
+    tmp_dir = f"{index_dir}.tmp-{suffix}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    try:
+        index.storage_context.persist(persist_dir=tmp_dir)
+        manifest = {
+            **manifest,
+            "owner": owner,
+            "repo": repo,
+            "commit_sha": commit_sha,
+            "model_type": model_type,
+            "updated_at": int(time.time()),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+
+        replace_dir(tmp_dir, index_dir, suffix)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    prune_repo_indexes(owner, repo, model_type, keep=index_dir)
+    return index_dir
+
+
+def replace_dir(tmp_dir: str, index_dir: str, suffix: str):
+    """
+    Move tmp_dir to index_dir. An existing index_dir is renamed aside first and removed afterwards,
+    so readers never see a directory being deleted. Between the two renames index_dir briefly
+    does not exist; load_index_dir waits for the new one while an `.old-` sibling is present.
+    """
+    old_dir = f"{index_dir}.old-{suffix}"
+    try:
+        os.rename(index_dir, old_dir)
+    except FileNotFoundError:
+        old_dir = None
+    try:
+        os.replace(tmp_dir, index_dir)
+    except OSError:
+        if not os.path.isdir(index_dir):
+            raise
+        # Another writer put an index for the same commit in place meanwhile; keep theirs.
+        print(f"[Indexing] {index_dir} was written concurrently, discarding this copy.")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def prune_repo_indexes(owner: str, repo: str, model_type: str, keep: str):
+    """Remove persisted indexes of owner/repo beyond the INDEX_KEEP_COMMITS most recently updated ones."""
+    repo_dir = os.path.join(INDEX_STORE_DIR, model_type, owner, repo)
+    index_dirs = []
+    for name in os.listdir(repo_dir):
+        index_dir = os.path.join(repo_dir, name)
+        if ".tmp-" in name or ".old-" in name or index_dir == keep:
+            continue
+        manifest = load_manifest(index_dir)
+        if manifest is not None:
+            index_dirs.append((manifest.get("updated_at", 0), index_dir))
+
+    index_dirs.sort(reverse=True)
+    for _, index_dir in index_dirs[max(INDEX_KEEP_COMMITS - 1, 0):]:
+        print(f"[Indexing] Removing old index {index_dir}.")
+        old_dir = f"{index_dir}.old-{os.getpid()}-{int(time.time() * 1000)}"
+        try:
+            os.rename(index_dir, old_dir)
+        except OSError:
+            # Already removed, or replaced by another process.
+            continue
+        shutil.rmtree(old_dir, ignore_errors=True)
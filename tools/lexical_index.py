@@ -0,0 +1,119 @@
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, Sequence, Tuple
+import numpy as np
+
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+# Things that look like file paths, e.g. stack-trace frames: File "pkg/mod.py", at fn (src/app.ts:12:3)
+PATH_MENTION_PATTERN = re.compile(r"[\w.\-]*[\w\-]/?[\w./\-]*\.[A-Za-z][\w]{0,5}\b")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i", "if",
+    "in", "into", "is", "it", "its", "not", "of", "on", "or", "that", "the", "this", "to", "was",
+    "we", "when", "with", "should", "would", "does", "do", "can",
+}
+
+
+def split_identifier(word: str) -> List[str]:
+    """Lowercased sub-words of an identifier (snake_case and camelCase), plus the identifier itself."""
+    parts = [part.lower() for piece in re.split(r"[_$]+", word) for part in CAMEL_CASE_PATTERN.findall(piece)]
+    whole = word.lower().strip("_$")
+    if whole and whole not in parts:
+        parts.append(whole)
+    return parts
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier-aware tokens of free text or source code, without stopwords and bare numbers (e.g. line numbers)."""
+    return [
+        token for word in IDENTIFIER_PATTERN.findall(text or "")
+        for token in split_identifier(word) if token not in STOPWORDS and not token.isdigit()
+    ]
+
+
+def path_tokens(path: str) -> List[str]:
+    """Tokens of a file path: every directory and file name, split into sub-words."""
+    stem, _ = os.path.splitext(path)
+    return tokenize(stem.replace("/", " ")) + [os.path.basename(path).lower()]
+
+
+def mentioned_paths(text: str, file_paths: Sequence[str]) -> List[str]:
+    """Repository files explicitly referenced in the text (stack-trace frames, quoted paths), in order of mention."""
+    by_suffix = defaultdict(list)
+    for path in file_paths:
+        parts = path.split("/")
+        for i in range(len(parts)):
+            by_suffix["/".join(parts[i:])].append(path)
+
+    mentioned = []
+    for mention in PATH_MENTION_PATTERN.findall(text or ""):
+        mention = mention.lstrip("./")
+        # Absolute paths from tracebacks: try progressively shorter suffixes until one is a repo path.
+        parts = mention.split("/")
+        for i in range(len(parts)):
+            matches = by_suffix.get("/".join(parts[i:]))
+            if matches:
+                if len(matches) <= 3:
+                    mentioned.extend(path for path in matches if path not in mentioned)
+                break
+    return mentioned
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over pre-tokenized documents.
+    Scoring only touches the postings of the query terms, so it stays cheap for large repos.
+    """
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        average_length = float(lengths.mean()) if self.size and lengths.sum() else 1.0
+        self.length_norm = k1 * (1 - b + b * lengths / average_length)
+        self.k1 = k1
+
+        postings = defaultdict(lambda: ([], []))
+        for doc_id, tokens in enumerate(documents):
+            for term, count in Counter(tokens).items():
+                doc_ids, counts = postings[term]
+                doc_ids.append(doc_id)
+                counts.append(count)
+        for term, (doc_ids, counts) in postings.items():
+            self.postings[term] = (np.array(doc_ids, dtype=np.int64), np.array(counts, dtype=np.float32))
+
+    def scores(self, query_tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document for the query (0 for documents without any query term)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term, weight in Counter(query_tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, counts = posting
+            idf = math.log(1 + (self.size - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += weight * idf * counts * (self.k1 + 1) / (counts + self.length_norm[doc_ids])
+        return scores
+
+    def top(self, query_tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        """The k best matching documents as (doc_id, score), best first; documents scoring 0 are left out."""
+        scores = self.scores(query_tokens)
+        matched = int(np.count_nonzero(scores))
+        k = min(k, matched)
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse several best-first rankings into one: score(item) = sum over rankings of 1 / (k + rank)."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+from config import MODEL_CACHE_MAX_BYTES, MODEL_CACHE_MODE, MODEL_CACHE_PATH
+from tools.tracing import annotate
+
+# MODEL_CACHE_MODE values:
+#   off     every request goes to the provider
+#   record  recorded responses are served, other requests go to the provider and are recorded
+#   replay  only recorded responses are served; any other request fails without calling the provider
+MODEL_CACHE_MODES = ("off", "record", "replay")
+if MODEL_CACHE_MODE not in MODEL_CACHE_MODES:
+    raise ValueError(f"MODEL_CACHE_MODE must be one of {', '.join(MODEL_CACHE_MODES)}, got {MODEL_CACHE_MODE!r}")
+
+cache_lock = threading.Lock()
+cache_connection = None
+
+
+def get_connection() -> sqlite3.Connection:
+    global cache_connection
+    if cache_connection is None:
+        directory = os.path.dirname(MODEL_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        cache_connection = sqlite3.connect(MODEL_CACHE_PATH, check_same_thread=False, timeout=30)
+        cache_connection.execute("PRAGMA journal_mode=WAL")
+        cache_connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, kind TEXT NOT NULL, body TEXT NOT NULL, "
+            "size INTEGER NOT NULL, used_at REAL NOT NULL)"
+        )
+        cache_connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        cache_connection.commit()
+    return cache_connection
+
+
+def request_key(kind: str, **request) -> str:
+    """SHA-256 of the canonical JSON form of a request (model, messages, tools, parameters)."""
+    canonical = json.dumps({"kind": kind, **request}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def lookup(key: str, kind: str) -> Optional[Any]:
+    """
+    Return the recorded response for a request, or None if it has to be sent to the provider.
+    Raises in replay mode when nothing was recorded for the request.
+    """
+    if MODEL_CACHE_MODE == "off":
+        return None
+    with cache_lock:
+        connection = get_connection()
+        row = connection.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+    if row is not None:
+        annotate(cache_hits=1)
+        return json.loads(row[0])
+    annotate(cache_misses=1)
+    if MODEL_CACHE_MODE == "replay":
+        raise Exception(f"No recorded {kind} response for request {key[:16]} (MODEL_CACHE_MODE=replay)")
+    return None
+
+
+def record(key: str, kind: str, response: Any):
+    """Store a provider response and evict least recently used ones beyond MODEL_CACHE_MAX_BYTES."""
+    if MODEL_CACHE_MODE != "record":
+        return
+    body = json.dumps(response, separators=(",", ":"), ensure_ascii=False, default=str)
+    with cache_lock:
+        connection = get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, kind, body, size, used_at) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, body, len(body.encode("utf-8")), time.time()),
+        )
+        connection.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used_at DESC, key) AS total FROM responses) "
+            "WHERE total > ?)",
+            (MODEL_CACHE_MAX_BYTES,),
+        )
+        connection.commit()
@@ -0,0 +1,31 @@
+import asyncio
+import hashlib
+import threading
+import weakref
+from typing import Any, Callable
+
+# Process-wide model clients, built once per (kind, provider, model, API key) and reused by every
+# request so their HTTP connection pools stay warm. Async clients pool connections on the event
+# loop they first run on, so those are kept per loop, like the async GitHub client.
+process_clients = {}
+loop_clients = weakref.WeakKeyDictionary()
+clients_lock = threading.Lock()
+
+
+def client_key(kind: str, provider: str, model: str, api_key: str) -> tuple:
+    # The key is hashed so the registry does not keep API keys as dictionary keys.
+    return (kind, provider, model, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+
+
+def shared_client(kind: str, provider: str, model: str, api_key: str, factory: Callable[[], Any], per_loop: bool = False) -> Any:
+    """
+    Return the shared client for (kind, provider, model, api_key), building it with `factory`
+    on first use. With `per_loop` the client is only shared within the running event loop.
+    """
+    key = client_key(kind, provider, model, api_key)
+    with clients_lock:
+        registry = loop_clients.setdefault(asyncio.get_running_loop(), {}) if per_loop else process_clients
+        client = registry.get(key)
+        if client is None:
+            client = registry[key] = factory()
+        return client
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from config import RATE_LIMIT_RESERVE
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first when the budget is scarce.
+PRIORITY_INTERACTIVE = 0  # issue details and comments
+PRIORITY_DEFAULT = 1      # tree listings, ref resolution, installation lookups
+PRIORITY_BULK = 2         # file content and archive fetches
+
+# GitHub asks clients to wait at least a minute after a secondary rate limit without Retry-After.
+SECONDARY_LIMIT_BACKOFF = 60
+
+
+class Waiter:
+    """A queued request, woken either on its event loop (async) or through a threading.Event (sync)."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.cancelled = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+            return
+
+        def resolve():
+            if not self.future.done():
+                self.future.set_result(None)
+
+        try:
+            self.loop.call_soon_threadsafe(resolve)
+        except RuntimeError:
+            # The waiter's event loop is closed; nobody is waiting any more.
+            self.cancelled = True
+
+
+class RateLimitBudget:
+    """Remaining request budget of a single installation (or of the app itself)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.waiters = []
+        self.timer: Optional[threading.Timer] = None
+        self.timer_at = 0.0
+
+    def ready_at(self, now: float) -> float:
+        """Earliest time a request may be sent, or `now` if one may be sent immediately."""
+        ready = max(now, self.blocked_until)
+        if self.remaining is not None and self.remaining <= RATE_LIMIT_RESERVE:
+            if self.reset_at > now:
+                ready = max(ready, self.reset_at)
+            else:
+                # The window has reset; the next response tells us the new budget.
+                self.remaining = None
+        return ready
+
+
+class RateLimitScheduler:
+    """
+    Process-wide GitHub rate-limit scheduler.
+
+    Budgets are tracked per installation from response headers. When a budget runs low or a
+    secondary limit / Retry-After is in effect, requests queue up and are released in priority
+    order once the budget allows it. Async callers await a future and never block the event
+    loop; sync callers only block their own thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.budgets: Dict[str, RateLimitBudget] = {}
+        self.sequence = itertools.count()
+
+    def get_budget(self, bucket: str) -> RateLimitBudget:
+        budget = self.budgets.get(bucket)
+        if budget is None:
+            budget = self.budgets[bucket] = RateLimitBudget(bucket)
+        return budget
+
+    def _try_take(self, budget: RateLimitBudget, now: float) -> bool:
+        if budget.ready_at(now) > now:
+            return False
+        if budget.remaining is not None:
+            budget.remaining -= 1
+        return True
+
+    def _enqueue(self, bucket: str, priority: int, waiter: Waiter) -> bool:
+        """Take a token immediately if possible, otherwise queue the waiter. Returns True if granted."""
+        with self.lock:
+            budget = self.get_budget(bucket)
+            if not budget.waiters and self._try_take(budget, time.time()):
+                return True
+            heapq.heappush(budget.waiters, (priority, next(self.sequence), waiter))
+            self._dispatch(budget)
+            return False
+
+    def _dispatch(self, budget: RateLimitBudget):
+        """Release queued requests in priority order while the budget allows. Caller holds the lock."""
+        now = time.time()
+        while budget.waiters:
+            _, _, waiter = budget.waiters[0]
+            if waiter.cancelled:
+                heapq.heappop(budget.waiters)
+                continue
+            if not self._try_take(budget, now):
+                break
+            heapq.heappop(budget.waiters)
+            waiter.wake()
+
+        if budget.waiters:
+            self._schedule(budget, budget.ready_at(now))
+
+    def _schedule(self, budget: RateLimitBudget, at: float):
+        if budget.timer is not None and budget.timer_at <= at:
+            return
+        if budget.timer is not None:
+            budget.timer.cancel()
+        logger.warning(f"[GitHub] Rate limit budget {budget.name} exhausted, queueing requests for {at - time.time():.0f}s.")
+        budget.timer = threading.Timer(max(at - time.time(), 0), self._on_timer, args=(budget,))
+        budget.timer.daemon = True
+        budget.timer_at = at
+        budget.timer.start()
+
+    def _on_timer(self, budget: RateLimitBudget):
+        with self.lock:
+            budget.timer = None
+            self._dispatch(budget)
+
+    async def acquire(self, bucket: str, priority: int = PRIORITY_DEFAULT):
+        """Wait, without blocking the event loop, until a request may be sent for this bucket."""
+        waiter = Waiter(asyncio.get_running_loop())
+        if self._enqueue(bucket, priority, waiter):
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            waiter.cancelled = True
+            raise
+
+    def acquire_sync(self, bucket: str, priority: int = PRIORITY_DEFAULT):
+        """Block the calling thread until a request may be sent for this bucket."""
+        waiter = Waiter()
+        if not self._enqueue(bucket, priority, waiter):
+            waiter.event.wait()
+
+    def update(self, bucket: str, response) -> bool:
+        """
+        Record the rate-limit state reported by a requests or httpx response.
+        Returns True if the request was rejected by a rate limit and should be retried.
+        """
+        now = time.time()
+        headers = response.headers
+        status_code = response.status_code
+        limited = False
+
+        with self.lock:
+            budget = self.get_budget(bucket)
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_time = headers.get("X-RateLimit-Reset")
+            if remaining is not None and reset_time is not None:
+                budget.remaining = int(remaining)
+                budget.reset_at = float(reset_time)
+                logger.debug(f"[GitHub] {bucket} remaining: {remaining}, reset: {reset_time}")
+
+            if status_code in (403, 429):
+                retry_after = headers.get("Retry-After")
+                text = response.text.lower()
+                if retry_after is not None:
+                    budget.blocked_until = max(budget.blocked_until, now + float(retry_after))
+                    limited = True
+                elif "secondary rate limit" in text:
+                    budget.blocked_until = max(budget.blocked_until, now + SECONDARY_LIMIT_BACKOFF)
+                    limited = True
+                elif "rate limit" in text:
+                    budget.remaining = 0
+                    if budget.reset_at <= now:
+                        budget.reset_at = now + SECONDARY_LIMIT_BACKOFF
+                    limited = True
+
+            if limited:
+                logger.warning(f"[GitHub] Rate limited on {bucket} ({status_code}); request will be retried.")
+            self._dispatch(budget)
+
+        return limited
+
+
+def request_bucket(headers: Optional[Dict]) -> str:
+    """Budget bucket of a request that did not name one: the app JWT or the token it authenticates with."""
+    authorization = (headers or {}).get("Authorization", "")
+    if not authorization:
+        return "anonymous"
+    return "token:" + hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:16]
+
+
+rate_limit_scheduler = RateLimitScheduler()
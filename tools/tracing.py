@@ -0,0 +1,221 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config import TRACE_LOG_PATH
+
+# Numeric span attributes that are also summed into per-span Prometheus counters.
+COUNTED_ATTRIBUTES = ("bytes", "prompt_tokens", "completion_tokens", "cache_hits", "cache_misses", "files", "chunks", "texts")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class RunTrace:
+    """Spans recorded during one agent run, for the per-run summary, and the run's cancellation flag."""
+
+    def __init__(self, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def add(self, record: dict):
+        with self.lock:
+            self.spans.append(record)
+
+    def cancel(self):
+        """Ask work of this run still running in worker threads to stop (see check_cancelled)."""
+        self.cancelled.set()
+
+    def finish(self, status: str = "ok") -> str:
+        """Record the whole run as an "agent.run" span and return the run summary."""
+        record_span("agent.run", time.perf_counter() - self.started, status, trace=self, **self.attributes)
+        return self.summary()
+
+    def summary(self) -> str:
+        """Time, call count, tokens, bytes and cache hits per span name."""
+        with self.lock:
+            spans = [record for record in self.spans if record["name"] != "agent.run"]
+        stages = defaultdict(lambda: defaultdict(float))
+        for record in spans:
+            stage = stages[record["name"]]
+            stage["count"] += 1
+            stage["seconds"] += record["duration_ms"] / 1000
+            stage["errors"] += record["status"] != "ok"
+            for attribute in COUNTED_ATTRIBUTES:
+                stage[attribute] += record["attributes"].get(attribute) or 0
+
+        lines = [f"⏱️ Run summary: {time.perf_counter() - self.started:.1f}s wall time"]
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+            details = [f"{int(stage['count'])}×", f"{stage['seconds']:.2f}s"]
+            if stage["prompt_tokens"] or stage["completion_tokens"]:
+                details.append(f"{int(stage['prompt_tokens'])} prompt + {int(stage['completion_tokens'])} completion tokens")
+            if stage["bytes"]:
+                details.append(f"{stage['bytes'] / 1024:.1f} KiB")
+            if stage["cache_hits"] or stage["cache_misses"]:
+                details.append(f"cache {int(stage['cache_hits'])} hits / {int(stage['cache_misses'])} misses")
+            if stage["errors"]:
+                details.append(f"{int(stage['errors'])} errors")
+            lines.append(f"- {name}: " + ", ".join(details))
+        return "\n".join(lines)
+
+
+class Metrics:
+    """Process-wide counters, gauges and duration histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[tuple, float] = defaultdict(float)
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[str, list] = {}
+
+    def observe(self, name: str, status: str, duration: float, attributes: dict):
+        with self.lock:
+            self.counters[("issuewise_spans_total", name, status)] += 1
+            histogram = self.histograms.setdefault(name, [[0] * len(DURATION_BUCKETS), 0.0, 0])
+            index = bisect.bisect_left(DURATION_BUCKETS, duration)
+            if index < len(DURATION_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+            for attribute in COUNTED_ATTRIBUTES:
+                value = attributes.get(attribute)
+                if value:
+                    self.counters[(f"issuewise_{attribute}_total", name, None)] += value
+            remaining = attributes.get("rate_limit_remaining")
+            if remaining is not None:
+                self.gauges[("issuewise_github_rate_limit_remaining", attributes.get("bucket") or "default")] = remaining
+
+    def render(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {name: (list(buckets), total, count) for name, (buckets, total, count) in self.histograms.items()}
+
+        lines = []
+        for metric in sorted({key[0] for key in counters}):
+            lines.append(f"# TYPE {metric} counter")
+            for (name, span, status), value in sorted(counters.items(), key=lambda item: str(item[0])):
+                if name == metric:
+                    labels = f'span="{span}"' + (f',status="{status}"' if status else "")
+                    lines.append(f"{metric}{{{labels}}} {value:g}")
+        if gauges:
+            lines.append("# TYPE issuewise_github_rate_limit_remaining gauge")
+            for (metric, bucket), value in sorted(gauges.items()):
+                lines.append(f'{metric}{{bucket="{bucket}"}} {value:g}')
+        if histograms:
+            lines.append("# TYPE issuewise_span_duration_seconds histogram")
+            for name, (buckets, total, count) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f'issuewise_span_duration_seconds_bucket{{span="{name}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'issuewise_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+                lines.append(f'issuewise_span_duration_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'issuewise_span_duration_seconds_count{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+trace_log_lock = threading.Lock()
+
+
+def export_span(record: dict):
+    """Append a finished span to the JSON lines trace log, if TRACE_LOG_PATH is set."""
+    if not TRACE_LOG_PATH:
+        return
+    line = json.dumps(record, default=str)
+    with trace_log_lock:
+        directory = os.path.dirname(TRACE_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def record_span(name: str, duration: float, status: str = "ok", trace: Optional[RunTrace] = None, parent_id: Optional[str] = None, span_id: Optional[str] = None, **attributes):
+    """Record a finished span: update metrics, add it to the run trace and export it."""
+    trace = trace or current_trace.get()
+    record = {
+        "name": name,
+        "trace_id": trace.trace_id if trace else None,
+        "span_id": span_id or uuid.uuid4().hex[:16],
+        "parent_id": parent_id,
+        "timestamp": time.time() - duration,
+        "duration_ms": round(duration * 1000, 3),
+        "status": status,
+        "attributes": attributes,
+    }
+    metrics.observe(name, status, duration, attributes)
+    if trace is not None:
+        trace.add(record)
+    export_span(record)
+
+
+def check_cancelled():
+    """
+    Raise RunCancelled if the agent run of the current context was cancelled. Called between
+    GitHub requests and embedding batches, since worker threads cannot be interrupted.
+    """
+    trace = current_trace.get()
+    if trace is not None and trace.cancelled.is_set():
+        raise RunCancelled(f"Agent run {trace.trace_id} was cancelled")
+
+
+class Span:
+    """An open span; attributes can be added with set() until it ends."""
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def annotate(**attributes):
+    """Add attributes to the innermost open span, if any."""
+    current = current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a span nested in the current one. Safe in sync code, coroutines and worker
+    threads started with asyncio.to_thread (which copy the context), but not across yields of
+    an async generator; use record_span there.
+    """
+    current = Span(name, attributes)
+    parent = current_span.get()
+    token = current_span.set(current)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        current.set(error=str(e) or type(e).__name__)
+        raise
+    finally:
+        current_span.reset(token)
+        record_span(
+            name, time.perf_counter() - started, status,
+            parent_id=parent.span_id if parent else None, span_id=current.span_id, **current.attributes
+        )
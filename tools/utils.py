@@ -1,20 +1,34 @@
 import asyncio
 import base64
+import tarfile
 from datetime import datetime, timezone, timedelta
 import jwt
 import threading
 import time
-from typing import List, Optional, Dict, Any
+from typing import IO, Iterable, List, Optional, Dict, Any
+from urllib.parse import urlparse
 import requests
+from requests.structures import CaseInsensitiveDict
 import logging
-from config import APP_ID, APP_PRIVATE_KEY
+from config import APP_ID, GITHUB_API_URL, INSTALLATION_ID_TTL, get_app_private_key
+from tools.github_client import annotate_github_response, github_request_async
+from tools.http_cache import cache_key, conditional_headers, revalidated_headers, store_response, touch_response
+from tools.rate_limit import PRIORITY_BULK, PRIORITY_DEFAULT, rate_limit_scheduler, request_bucket
+from tools.tracing import annotate, check_cancelled, span
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 installation_tokens = {}
 token_lock = threading.Lock()
+# One lock per installation, held while its token is fetched, so concurrent callers wait for a
+# single request instead of each fetching a token; token_lock itself is never held over HTTP.
+token_fetch_locks = {}
+
+installation_ids = {}
+installation_id_lock = threading.Lock()
+
+validated_app = None
+app_validation_lock = threading.Lock()
 
 
 def validate_app_configuration() -> Dict[str, Any]:
@@ -25,7 +39,7 @@ def validate_app_configuration() -> Dict[str, Any]:
             "Authorization": f"Bearer {jwt_token}",
             "Accept": "application/vnd.github.v3+json",
         }
-        response = requests.get("https://api.github.com/app", headers=headers)
+        response = requests.get(f"{GITHUB_API_URL}/app", headers=headers)
         
         if response.status_code != 200:
             raise Exception(f"Failed to validate app configuration: {response.status_code} {response.text}")
@@ -84,74 +98,134 @@ def generate_jwt():
             "exp": now + (10 * 60),
             "iss": APP_ID,
         }
-        encoded_jwt = jwt.encode(payload, APP_PRIVATE_KEY, algorithm="RS256")
+        encoded_jwt = jwt.encode(payload, get_app_private_key(), algorithm="RS256")
         return encoded_jwt
     except Exception as e:
         logger.error("Failed to generate JWT: %s", str(e))
         raise
 
 
-def github_request(method, url, headers=None, **kwargs):
+def cached_response(cached: Dict[str, Any], not_modified: requests.Response) -> requests.Response:
+    """Build a 200 response from a cache entry that GitHub confirmed with 304 Not Modified."""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict(revalidated_headers(cached, not_modified.headers))
+    response._content = cached["body"]
+    response.url = not_modified.url
+    response.request = not_modified.request
+    response.encoding = "utf-8"
+    return response
+
+
+def github_request(method, url, headers=None, bucket=None, priority=PRIORITY_DEFAULT, **kwargs):
+    """
+    Send a GitHub API request, waiting for the shared rate-limit scheduler to release it.
+    bucket names the rate-limit budget (one per installation); priority orders queued requests.
+    """
     if headers is None:
         jwt_token = generate_jwt()
         headers = {
             "Authorization": f"Bearer {jwt_token}",
             "Accept": "application/vnd.github.v3+json",
         }
-    while True:
-        response = requests.request(method, url, headers=headers, **kwargs)
-        
-        remaining = response.headers.get("X-RateLimit-Remaining")
-        reset_time = response.headers.get("X-RateLimit-Reset")
-
-        if remaining is None or reset_time is None:
+        bucket = bucket or "app"
+    bucket = bucket or request_bucket(headers)
+    key = None if kwargs.get("stream") else cache_key(method, url, headers)
+    with span("github.request", method=method, path=urlparse(url).path, bucket=bucket):
+        cached, headers = conditional_headers(key, headers)
+        while True:
+            rate_limit_scheduler.acquire_sync(bucket, priority)
+            check_cancelled()
+            response = requests.request(method, url, headers=headers, **kwargs)
+            if rate_limit_scheduler.update(bucket, response):
+                # Release the connection before retrying; streamed responses are not read otherwise.
+                response.close()
+                continue
+
+            revalidated = response.status_code == 304 and cached is not None
+            annotate_github_response(response, key is not None, revalidated, streamed=bool(kwargs.get("stream")))
+            if revalidated:
+                touch_response(key)
+                return cached_response(cached, response)
+            if key is not None:
+                store_response(key, response.status_code, response.headers, response.content)
             return response
-        
-        remaining = int(remaining)
-        reset_time = int(reset_time)
 
-        logger.debug(f"[GitHub] Remaining: {remaining}, Reset: {reset_time}")
 
-        if response.status_code == 403 and "rate limit" in response.text.lower():
-            wait = reset_time - int(time.time()) + 5
-            logger.warning(f"Hit rate limit. Sleeping for {wait} seconds.")
-            time.sleep(max(wait, 0))
-            continue
-        if remaining <= 2:
-            wait = reset_time - int(time.time()) + 5
-            logger.warning(f"Approaching rate limit ({remaining} left). Sleeping for {wait} seconds.")
-            time.sleep(max(wait, 0))
-            continue
-
-        return response
+def installation_bucket(installation_id) -> str:
+    """Rate-limit budget bucket of requests made with an installation token."""
+    return f"installation:{installation_id}"
 
 
 def get_app_installations():
     """Get all installations of the GitHub App."""
-    url = "https://api.github.com/app/installations"
+    url = f"{GITHUB_API_URL}/app/installations"
     response = github_request("GET", url)
     if response.status_code != 200:
         raise Exception(f"Failed to get app installations: {response.status_code} {response.text}")
     return response.json()
 
 
+def ensure_app_configuration() -> Dict[str, Any]:
+    """Validate the GitHub App configuration once per process and return app details."""
+    global validated_app
+    with app_validation_lock:
+        if validated_app is not None:
+            return validated_app
+        try:
+            app_data = validate_app_configuration()
+            logger.info("Using GitHub App: %s (ID: %s)", app_data.get("name"), app_data.get("id"))
+        except Exception as e:
+            logger.error("GitHub App configuration validation failed: %s", str(e))
+            raise Exception(
+                "GitHub App is not properly configured. Please check:\n"
+                "1. APP_ID is set correctly in your .env file\n"
+                "2. APP_PRIVATE_KEY is valid and properly formatted\n"
+                "3. The GitHub App exists and is active"
+            )
+        validated_app = app_data
+        return validated_app
+
+
 def get_installation_id(owner: str, repo: str) -> Optional[int]:
-    """Fetch the installation ID for the app on a repo."""
-    # First validate app configuration
-    try:
-        app_data = validate_app_configuration()
-        logger.info("Using GitHub App: %s (ID: %s)", app_data.get("name"), app_data.get("id"))
-    except Exception as e:
-        logger.error("GitHub App configuration validation failed: %s", str(e))
-        raise Exception(
-            "GitHub App is not properly configured. Please check:\n"
-            "1. APP_ID is set correctly in your .env file\n"
-            "2. APP_PRIVATE_KEY is valid and properly formatted\n"
-            "3. The GitHub App exists and is active"
-        )
+    """Return the installation ID for the app on a repo, cached for INSTALLATION_ID_TTL seconds."""
+    key = (owner.lower(), repo.lower())
+    with installation_id_lock:
+        cached = installation_ids.get(key)
+        if cached and cached["expires_at"] > time.time():
+            return cached["id"]
+
+    ensure_app_configuration()
+    installation_id = lookup_installation_id(owner, repo)
+
+    with installation_id_lock:
+        installation_ids[key] = {"id": installation_id, "expires_at": time.time() + INSTALLATION_ID_TTL}
+    return installation_id
 
+
+def invalidate_installation(owner: str, repo: str):
+    """Forget the cached installation ID and token of a repo, e.g. after the app was uninstalled."""
+    with installation_id_lock:
+        cached = installation_ids.pop((owner.lower(), repo.lower()), None)
+    if cached:
+        logger.info("Invalidated cached installation %s for %s/%s", cached["id"], owner, repo)
+        with token_lock:
+            installation_tokens.pop(cached["id"], None)
+
+
+def check_installation_response(owner: str, repo: str, response, repo_level: bool = True):
+    """
+    Invalidate the cached installation of a repo when a response suggests it is gone:
+    401 always, and 404 from repository-level endpoints the installation could read before.
+    """
+    if response.status_code == 401 or (repo_level and response.status_code == 404):
+        invalidate_installation(owner, repo)
+
+
+def lookup_installation_id(owner: str, repo: str) -> Optional[int]:
+    """Fetch the installation ID for the app on a repo."""
     # Try to get repository installation
-    url = f"https://api.github.com/repos/{owner}/{repo}/installation"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/installation"
     response = github_request("GET", url)
     
     if response.status_code == 200:
@@ -159,7 +233,7 @@ def get_installation_id(owner: str, repo: str) -> Optional[int]:
         return data["id"]
     elif response.status_code == 404:
         # If not found, check if the app is installed on the organization
-        org_url = f"https://api.github.com/orgs/{owner}/installation"
+        org_url = f"{GITHUB_API_URL}/orgs/{owner}/installation"
         org_response = github_request("GET", org_url)
         
         if org_response.status_code == 200:
@@ -201,65 +275,178 @@ def get_installation_id(owner: str, repo: str) -> Optional[int]:
         raise Exception(f"Failed to get installation ID for {owner}/{repo}: {response.status_code} {response.text}")
 
 
-def get_installation_token(installation_id):
-    """Return a valid installation token, fetch new if expired or missing."""
+def cached_installation_token(installation_id):
+    """Return the cached installation token if it is valid for at least 30 more seconds, else None."""
     with token_lock:
         token_info = installation_tokens.get(installation_id)
         if token_info and token_info["expires_at"] > datetime.now(timezone.utc) + timedelta(seconds=30):
             return token_info["token"]
+        return None
+
+
+def get_installation_token(installation_id):
+    """Return a valid installation token, fetch new if expired or missing."""
+    token = cached_installation_token(installation_id)
+    if token:
+        return token
 
-        url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
+    with token_lock:
+        fetch_lock = token_fetch_locks.setdefault(installation_id, threading.Lock())
+    with fetch_lock:
+        # Another thread may have fetched the token while this one waited.
+        token = cached_installation_token(installation_id)
+        if token:
+            return token
+
+        url = f"{GITHUB_API_URL}/app/installations/{installation_id}/access_tokens"
         response = github_request("POST", url)
         if response.status_code != 201:
+            if response.status_code in (401, 404):
+                # The installation no longer exists; drop every repo still mapped to it.
+                with installation_id_lock:
+                    for key in [key for key, cached in installation_ids.items() if cached["id"] == installation_id]:
+                        installation_ids.pop(key)
             raise Exception(f"Failed to fetch installation token: {response.status_code} {response.text}")
 
         token_data = response.json()
         token = token_data["token"]
         expires_at = datetime.strptime(token_data["expires_at"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
 
-        installation_tokens[installation_id] = {"token": token, "expires_at": expires_at}
+        with token_lock:
+            installation_tokens[installation_id] = {"token": token, "expires_at": expires_at}
         return token
 
 
-async def fetch_repo_files(owner: str, repo: str, ref: str = "main") -> List[str]:
+async def resolve_commit_sha(owner: str, repo: str, ref: str = "main") -> str:
     """
-    Lists all files in the repository by recursively fetching the Git tree from GitHub API.
-    Returns a list of file paths.
+    Resolves a branch, tag or commit reference to the full commit SHA it points at.
     """
-    installation_id = get_installation_id(owner, repo)
-    token = get_installation_token(installation_id)
-    url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{ref}?recursive=1"
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+    token = await asyncio.to_thread(get_installation_token, installation_id)
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/commits/{ref}"
     headers = {
         "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.v3+json"
+        "Accept": "application/vnd.github.sha"
     }
 
-    response = await asyncio.to_thread(github_request, "GET", url, headers=headers)
+    response = await github_request_async("GET", url, headers=headers, bucket=installation_bucket(installation_id))
     if response.status_code != 200:
-        raise Exception(f"Failed to list repository files: {response.status_code} {response.text}")
+        check_installation_response(owner, repo, response)
+        raise Exception(f"Failed to resolve ref {ref}: {response.status_code} {response.text}")
+
+    return response.text.strip()
 
-    tree = response.json().get("tree", [])
-    file_paths = [item["path"] for item in tree if item["type"] == "blob"]
-    return file_paths
+
+async def fetch_repo_tree(owner: str, repo: str, ref: str = "main") -> Dict[str, str]:
+    """
+    Fetches the recursive Git tree of the repository from GitHub API.
+    Returns a mapping of file path to blob SHA.
+    """
+    with span("github.tree", repo=f"{owner}/{repo}", ref=ref):
+        installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+        token = await asyncio.to_thread(get_installation_token, installation_id)
+        url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{ref}?recursive=1"
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+
+        response = await github_request_async("GET", url, headers=headers, bucket=installation_bucket(installation_id))
+        if response.status_code != 200:
+            check_installation_response(owner, repo, response)
+            raise Exception(f"Failed to list repository files: {response.status_code} {response.text}")
+
+        tree = response.json().get("tree", [])
+        files = {item["path"]: item["sha"] for item in tree if item["type"] == "blob"}
+        annotate(files=len(files), truncated=bool(response.json().get("truncated")))
+        return files
+
+
+async def fetch_repo_files(owner: str, repo: str, ref: str = "main") -> List[str]:
+    """
+    Lists all files in the repository by recursively fetching the Git tree from GitHub API.
+    Returns a list of file paths.
+    """
+    tree = await fetch_repo_tree(owner, repo, ref)
+    return list(tree.keys())
 
 
 async def fetch_file_content(owner: str, repo: str, path: str, ref: str = "main") -> str:
     """
     Fetches the content of a file from the GitHub repository.
     """
-    installation_id = get_installation_id(owner, repo)
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
     token = await asyncio.to_thread(get_installation_token, installation_id)
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={ref}"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/contents/{path}?ref={ref}"
     headers = {
         "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github.v3+json"
     }
 
-    response = await asyncio.to_thread(github_request, "GET", url, headers=headers)
+    response = await github_request_async(
+        "GET", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_BULK
+    )
     if response.status_code != 200:
+        check_installation_response(owner, repo, response, repo_level=False)
         raise Exception(f"Failed to fetch file content {path}: {response.status_code} {response.text}")
 
     content_json = response.json()
     content = base64.b64decode(content_json["content"]).decode("utf-8", errors="ignore")
     return content
+
+
+def extract_archive_files(fileobj: IO[bytes], paths: Iterable[str]) -> Dict[str, str]:
+    """
+    Stream-extracts the given paths from a gzipped repository tarball.
+    GitHub archives nest every file under a single top-level directory, which is stripped.
+    Reading stops as soon as all requested paths have been found.
+    """
+    wanted = set(paths)
+    files = {}
+    if not wanted:
+        return files
+
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            check_cancelled()
+            if not member.isfile():
+                continue
+            _, _, path = member.name.partition("/")
+            if path not in wanted:
+                continue
+            extracted = archive.extractfile(member)
+            files[path] = extracted.read().decode("utf-8", errors="ignore")
+            if len(files) == len(wanted):
+                break
+    return files
+
+
+async def fetch_repo_archive_files(owner: str, repo: str, paths: Iterable[str], ref: str = "main") -> Dict[str, str]:
+    """
+    Fetches the content of many files at once by streaming the repository tarball for ref.
+    Returns a mapping of file path to content for the requested paths found in the archive.
+    """
+    installation_id = await asyncio.to_thread(get_installation_id, owner, repo)
+    token = await asyncio.to_thread(get_installation_token, installation_id)
+
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/tarball/{ref}"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+    def download():
+        response = github_request(
+            "GET", url, headers=headers, bucket=installation_bucket(installation_id), priority=PRIORITY_BULK, stream=True
+        )
+        try:
+            if response.status_code != 200:
+                check_installation_response(owner, repo, response)
+                raise Exception(f"Failed to download repository archive: {response.status_code} {response.text}")
+            response.raw.decode_content = True
+            return extract_archive_files(response.raw, paths)
+        finally:
+            response.close()
+
+    return await asyncio.to_thread(download)
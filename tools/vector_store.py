@@ -0,0 +1,449 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+from config import VECTOR_STORE_DTYPE, VECTOR_STORE_IVF_MIN_VECTORS, VECTOR_STORE_MEMORY_MB, VECTOR_STORE_NPROBE, VECTOR_STORE_RERANK
+
+
+STORE_FORMAT = "issuewise-quantized-v1"
+# Sidecar files written next to the vector store JSON by persist()
+CODES_SUFFIX = ".codes.npy"
+SCALES_SUFFIX = ".scales.npy"
+LISTS_SUFFIX = ".lists.npy"
+CENTROIDS_SUFFIX = ".centroids.npy"
+VECTORS_SUFFIX = ".vectors.f32"
+
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 32
+MIN_LISTS = 16
+MAX_LISTS = 4096
+# Retrain the coarse quantizer when the store has grown this much since the last training
+RETRAIN_GROWTH = 4
+# Rows scored or copied at once, to bound temporary memory
+CHUNK_ROWS = 16384
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.nan_to_num(np.asarray(matrix, dtype=np.float32), nan=0.0, posinf=0.0, neginf=0.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Codes and per-row scales of unit vectors: float16 as is, or int8 scaled to each row's largest component."""
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def spherical_kmeans(sample: np.ndarray, num_lists: int, seed: int = 0) -> np.ndarray:
+    """Unit-norm centroids of `sample` (rows are unit vectors) by k-means on cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), num_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.linalg.norm(sums, axis=1) == 0
+        # Empty lists are restarted from random sample rows.
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class VectorFile:
+    """
+    Full-precision float32 rows in flat files read through memory maps: the file of a persisted
+    store (read-only) followed by an append-only spill file for rows added since it was loaded.
+    Only rows that are read are paged in, so these vectors do not count against the memory budget.
+    """
+
+    def __init__(self, dim: int, base_path: Optional[str] = None, base_rows: int = 0):
+        self.dim = dim
+        self.base = np.memmap(base_path, dtype=np.float32, mode="r", shape=(base_rows, dim)) if base_rows else None
+        self.base_rows = base_rows
+        self.spill_dir = tempfile.mkdtemp(prefix="issuewise-vectors-")
+        self.spill_path = os.path.join(self.spill_dir, "vectors.f32")
+        self.spill_rows = 0
+        self.spill = None
+        weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    def __len__(self) -> int:
+        return self.base_rows + self.spill_rows
+
+    def append(self, matrix: np.ndarray):
+        with open(self.spill_path, "ab") as f:
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+        self.spill_rows += len(matrix)
+
+    def gather(self, rows: np.ndarray) -> np.ndarray:
+        result = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < self.base_rows
+        if in_base.any():
+            result[in_base] = self.base[rows[in_base]]
+        if not in_base.all():
+            if self.spill is None or self.spill.shape[0] < self.spill_rows:
+                self.spill = np.memmap(self.spill_path, dtype=np.float32, mode="r", shape=(self.spill_rows, self.dim))
+            result[~in_base] = self.spill[rows[~in_base] - self.base_rows]
+        return result
+
+    def write(self, path: str, rows: np.ndarray):
+        with open(path, "wb") as f:
+            for start in range(0, len(rows), CHUNK_ROWS):
+                f.write(self.gather(rows[start:start + CHUNK_ROWS]).tobytes())
+
+
+class QuantizedVectorStore(BasePydanticVectorStore):
+    """
+    Memory-bounded vector store for large repositories.
+
+    Unit-normalized embeddings are kept as contiguous float16 or int8 codes. Once the
+    store holds VECTOR_STORE_IVF_MIN_VECTORS rows, queries only scan the rows of the `nprobe`
+    inverted lists (about sqrt(n) k-means cells) closest to the query, so latency grows
+    sub-linearly with the repository. The best `rerank` x top_k candidates are then re-scored
+    exactly against the float32 vectors, which stay on disk.
+
+    The codes are held in memory within `memory_budget_mb`: with dtype "auto" they are float16
+    while they fit and int8 after that, and codes that still do not fit are kept in a
+    memory-mapped file. Node ids and the docstore (node text) are not covered by the budget.
+    """
+
+    stores_text: bool = False
+    dtype: str = VECTOR_STORE_DTYPE
+    memory_budget_mb: int = VECTOR_STORE_MEMORY_MB
+    nprobe: int = VECTOR_STORE_NPROBE
+    rerank: int = VECTOR_STORE_RERANK
+    ivf_min_vectors: int = VECTOR_STORE_IVF_MIN_VECTORS
+
+    _lock: Any = PrivateAttr()
+    _ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _rows: dict = PrivateAttr()
+    _doc_rows: dict = PrivateAttr()
+    _count: int = PrivateAttr()
+    _alive_count: int = PrivateAttr()
+    _codes: Optional[np.ndarray] = PrivateAttr()
+    _scales: Optional[np.ndarray] = PrivateAttr()
+    _alive: Optional[np.ndarray] = PrivateAttr()
+    _lists: Optional[np.ndarray] = PrivateAttr()
+    _centroids: Optional[np.ndarray] = PrivateAttr()
+    _trained_size: int = PrivateAttr()
+    _list_order: Optional[np.ndarray] = PrivateAttr()
+    _list_offsets: Optional[np.ndarray] = PrivateAttr()
+    _vectors: Optional[VectorFile] = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.RLock()
+        self._ids = []
+        self._ref_doc_ids = []
+        self._rows = {}
+        self._doc_rows = {}
+        self._count = 0
+        self._alive_count = 0
+        self._codes = None
+        self._scales = None
+        self._alive = None
+        self._lists = None
+        self._centroids = None
+        self._trained_size = 0
+        self._list_order = None
+        self._list_offsets = None
+        self._vectors = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def _code_dtype(self) -> str:
+        if self._codes is not None:
+            return "int8" if self._codes.dtype == np.int8 else "float16"
+        return "int8" if self.dtype == "int8" else "float16"
+
+    def _target_dtype(self, capacity: int, dim: int) -> str:
+        """Code dtype for `capacity` rows: as configured, or with "auto" float16 until it would exceed the budget."""
+        if self.dtype in ("float16", "int8"):
+            return self.dtype
+        if self._code_dtype() == "int8" or capacity * dim * 2 > self.memory_budget_mb * 1024 * 1024:
+            return "int8"
+        return "float16"
+
+    def _relocate_codes(self, source: np.ndarray, capacity: int, dtype: str):
+        """
+        Copy the first self._count codes of `source` into new storage for `capacity` rows, converting
+        them to `dtype`. The codes stay in memory while they fit VECTOR_STORE_MEMORY_MB; beyond that
+        they are kept in a memory-mapped spill file, so the OS pages them in and out as needed.
+        """
+        dim = source.shape[1]
+        numpy_dtype = np.int8 if dtype == "int8" else np.float16
+        on_disk = capacity * dim * np.dtype(numpy_dtype).itemsize > self.memory_budget_mb * 1024 * 1024
+        was_on_disk = isinstance(self._codes, np.memmap)
+        if dtype != self._code_dtype() and self._codes is not None:
+            print(f"[Indexing] Vector store reached {self._count} rows, switching codes from float16 to int8 to stay within {self.memory_budget_mb} MB.")
+        if on_disk and not was_on_disk:
+            print(f"[Indexing] Vector store codes for {capacity} rows exceed {self.memory_budget_mb} MB, keeping them in a memory-mapped file.")
+
+        if on_disk:
+            path = os.path.join(self._vectors.spill_dir, f"codes-{capacity}.bin")
+            target = np.memmap(path, dtype=numpy_dtype, mode="w+", shape=(capacity, dim))
+        else:
+            target = np.zeros((capacity, dim), dtype=numpy_dtype)
+        for start in range(0, self._count, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, self._count)
+            block = np.asarray(source[start:end])
+            if block.dtype != numpy_dtype:
+                block, self._scales[start:end] = quantize(normalize_rows(dequantize(block, self._scales[start:end])), dtype)
+            target[start:end] = block
+
+        previous = self._codes
+        self._codes = target
+        if isinstance(previous, np.memmap) and previous.filename and previous.filename.startswith(self._vectors.spill_dir):
+            filename = previous.filename
+            del previous
+            os.remove(filename)
+
+    def _reserve(self, rows: int, dim: int):
+        """Grow the row arrays to hold `rows` rows; codes are moved or converted to stay within the memory budget."""
+        if self._codes is not None and rows <= self._codes.shape[0]:
+            return
+        capacity = max(rows, 1024) if self._codes is None else max(rows, self._codes.shape[0] * 2)
+        if self._codes is None:
+            self._scales = np.ones(capacity, dtype=np.float32)
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._lists = np.full(capacity, -1, dtype=np.int32)
+            source = np.zeros((0, dim), dtype=np.int8 if self._code_dtype() == "int8" else np.float16)
+        else:
+            for name, fill in (("_scales", 1.0), ("_alive", False), ("_lists", -1)):
+                array = getattr(self, name)
+                grown = np.full(capacity, fill, dtype=array.dtype)
+                grown[:self._count] = array[:self._count]
+                setattr(self, name, grown)
+            source = self._codes
+        self._relocate_codes(source, capacity, self._target_dtype(capacity, dim))
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        matrix = normalize_rows([node.get_embedding() for node in nodes])
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = VectorFile(matrix.shape[1])
+            elif matrix.shape[1] != self._vectors.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match vector store dimension {self._vectors.dim}")
+            for node in nodes:
+                # Re-adding a node replaces its previous vector.
+                if node.node_id in self._rows:
+                    self._remove_row(self._rows[node.node_id])
+
+            start = self._count
+            self._reserve(start + len(nodes), matrix.shape[1])
+            codes, scales = quantize(matrix, self._code_dtype())
+            end = start + len(nodes)
+            self._codes[start:end] = codes
+            self._scales[start:end] = scales
+            self._alive[start:end] = True
+            self._vectors.append(matrix)
+            for offset, node in enumerate(nodes):
+                self._ids.append(node.node_id)
+                self._ref_doc_ids.append(node.ref_doc_id or "None")
+                self._rows[node.node_id] = start + offset
+                self._doc_rows.setdefault(self._ref_doc_ids[-1], []).append(start + offset)
+            self._count = end
+            self._alive_count += len(nodes)
+
+            if self._centroids is not None:
+                self._lists[start:end] = np.argmax(matrix @ self._centroids.T, axis=1)
+                self._list_order = None
+            if self._alive_count >= self.ivf_min_vectors and (
+                self._centroids is None or self._alive_count >= self._trained_size * RETRAIN_GROWTH
+            ):
+                self._train()
+        return [node.node_id for node in nodes]
+
+    def _remove_row(self, row: int):
+        if self._alive[row]:
+            self._alive[row] = False
+            self._alive_count -= 1
+            del self._rows[self._ids[row]]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            for row in self._doc_rows.pop(ref_doc_id, []):
+                self._remove_row(row)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise ValueError("QuantizedVectorStore does not store metadata, so it cannot delete by filters")
+        with self._lock:
+            for node_id in node_ids or []:
+                if node_id in self._rows:
+                    self._remove_row(self._rows[node_id])
+
+    def clear(self) -> None:
+        with self._lock:
+            self.__init__(**self.model_dump())
+
+    def _train(self):
+        """Train the coarse quantizer (about sqrt(n) lists) on a sample and assign every row to a list."""
+        alive_rows = np.flatnonzero(self._alive[:self._count])
+        num_lists = int(np.clip(int(np.sqrt(len(alive_rows))), MIN_LISTS, MAX_LISTS))
+        rng = np.random.default_rng(len(alive_rows))
+        sample_rows = np.sort(rng.choice(alive_rows, min(len(alive_rows), num_lists * KMEANS_SAMPLE_PER_LIST), replace=False))
+        sample = normalize_rows(dequantize(self._codes[sample_rows], self._scales[sample_rows]))
+        print(f"[Indexing] Training vector store IVF with {num_lists} lists on {len(sample_rows)} of {len(alive_rows)} vectors.")
+        self._centroids = spherical_kmeans(sample, num_lists)
+        for start in range(0, self._count, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, self._count)
+            block = dequantize(self._codes[start:end], self._scales[start:end])
+            self._lists[start:end] = np.argmax(block @ self._centroids.T, axis=1)
+        self._trained_size = len(alive_rows)
+        self._list_order = None
+
+    def _candidate_rows(self, query: np.ndarray, needed: int) -> np.ndarray:
+        """Rows in the inverted lists closest to the query (all rows before the IVF is trained)."""
+        if self._centroids is None:
+            return np.arange(self._count)
+        if self._list_order is None:
+            lists = self._lists[:self._count]
+            self._list_order = np.argsort(lists, kind="stable")
+            self._list_offsets = np.searchsorted(lists[self._list_order], np.arange(len(self._centroids) + 1))
+        ranked_lists = np.argsort(-(self._centroids @ query))
+        probes = min(self.nprobe, len(ranked_lists))
+        while True:
+            rows = np.concatenate([
+                self._list_order[self._list_offsets[i]:self._list_offsets[i + 1]] for i in ranked_lists[:probes]
+            ])
+            rows = rows[self._alive[rows]]
+            # Probe more lists when the closest ones hold too few live rows.
+            if len(rows) >= needed or probes >= len(ranked_lists):
+                return rows
+            probes = min(probes * 2, len(ranked_lists))
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("QuantizedVectorStore does not store metadata, so it cannot filter queries")
+        if query.query_embedding is None:
+            raise ValueError("QuantizedVectorStore only supports embedding queries")
+        query_vector = normalize_rows([query.query_embedding])[0]
+        top_k = query.similarity_top_k
+
+        with self._lock:
+            if self._alive_count == 0:
+                return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+            shortlist = max(top_k * self.rerank, top_k)
+            if query.node_ids is not None or query.doc_ids is not None:
+                # Restricted queries are scored exactly over the allowed rows.
+                if query.node_ids is not None:
+                    rows = np.array(sorted({self._rows[node_id] for node_id in query.node_ids if node_id in self._rows}), dtype=np.int64)
+                else:
+                    rows = np.flatnonzero(self._alive[:self._count])
+                if query.doc_ids is not None:
+                    doc_ids = set(query.doc_ids)
+                    rows = rows[[self._ref_doc_ids[row] in doc_ids for row in rows]] if len(rows) else rows
+                shortlist = len(rows)
+            else:
+                rows = self._candidate_rows(query_vector, shortlist)
+                rows = rows[self._alive[rows]]
+
+            # Approximate scores on the codes, in chunks to bound temporary memory.
+            if len(rows) > shortlist:
+                scores = np.empty(len(rows), dtype=np.float32)
+                for start in range(0, len(rows), CHUNK_ROWS):
+                    block = rows[start:start + CHUNK_ROWS]
+                    scores[start:start + len(block)] = (self._codes[block].astype(np.float32) @ query_vector) * self._scales[block]
+                rows = rows[np.argpartition(-scores, shortlist - 1)[:shortlist]]
+
+            # Exact re-ranking against the full-precision vectors.
+            rows = np.sort(rows)
+            exact = self._vectors.gather(rows) @ query_vector if len(rows) else np.empty(0, dtype=np.float32)
+            order = np.argsort(-exact, kind="stable")[:top_k]
+            ids = [self._ids[rows[i]] for i in order]
+            similarities = [float(exact[i]) for i in order]
+        return VectorStoreQueryResult(nodes=None, similarities=similarities, ids=ids)
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """Write live rows compactly: JSON with ids and settings, plus codes, lists, centroids and float32 vectors."""
+        directory = os.path.dirname(persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._count]) if self._count else np.empty(0, dtype=np.int64)
+            meta = {
+                "format": STORE_FORMAT,
+                "dim": self._vectors.dim if self._vectors is not None else None,
+                "dtype": self.dtype,
+                "trained_size": self._trained_size,
+                "ids": [self._ids[row] for row in rows],
+                "ref_doc_ids": [self._ref_doc_ids[row] for row in rows],
+            }
+            if len(rows):
+                # Codes are copied in chunks, since they may be larger than the memory budget.
+                codes = np.lib.format.open_memmap(persist_path + CODES_SUFFIX, mode="w+", dtype=self._codes.dtype, shape=(len(rows), self._codes.shape[1]))
+                for start in range(0, len(rows), CHUNK_ROWS):
+                    codes[start:start + CHUNK_ROWS] = self._codes[rows[start:start + CHUNK_ROWS]]
+                codes.flush()
+                del codes
+                np.save(persist_path + SCALES_SUFFIX, self._scales[rows])
+                np.save(persist_path + LISTS_SUFFIX, self._lists[rows])
+                self._vectors.write(persist_path + VECTORS_SUFFIX, rows)
+            if self._centroids is not None:
+                np.save(persist_path + CENTROIDS_SUFFIX, self._centroids)
+        with open(persist_path, "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs=None) -> "QuantizedVectorStore":
+        with open(persist_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"{persist_path} is not a {cls.class_name()} file")
+
+        store = cls(dtype=meta["dtype"])
+        count = len(meta["ids"])
+        if not count:
+            return store
+        store._scales = np.load(persist_path + SCALES_SUFFIX)
+        store._lists = np.load(persist_path + LISTS_SUFFIX)
+        store._alive = np.ones(count, dtype=bool)
+        store._ids = list(meta["ids"])
+        store._ref_doc_ids = list(meta["ref_doc_ids"])
+        store._rows = {node_id: row for row, node_id in enumerate(store._ids)}
+        for row, ref_doc_id in enumerate(store._ref_doc_ids):
+            store._doc_rows.setdefault(ref_doc_id, []).append(row)
+        store._count = store._alive_count = count
+        store._vectors = VectorFile(meta["dim"], persist_path + VECTORS_SUFFIX, count)
+        # Codes are read through a memory map and copied into memory or a spill file within the budget.
+        codes = np.load(persist_path + CODES_SUFFIX, mmap_mode="r")
+        dtype = "int8" if codes.dtype == np.int8 else store._target_dtype(count, meta["dim"])
+        store._relocate_codes(codes, count, dtype)
+        if os.path.exists(persist_path + CENTROIDS_SUFFIX):
+            store._centroids = np.load(persist_path + CENTROIDS_SUFFIX)
+            store._trained_size = meta["trained_size"]
+        return store
+
+
+def is_quantized_store(persist_path: str) -> bool:
+    """Whether a persisted vector store was written by QuantizedVectorStore, from the start of its JSON."""
+    if not os.path.exists(persist_path):
+        return False
+    with open(persist_path, "r") as f:
+        return STORE_FORMAT in f.read(64)
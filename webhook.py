@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+from contextlib import asynccontextmanager
+import gradio as gr
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from agent.jobs import JobQueue, JobWorkerPool
+from app import demo
+from config import DEFAULT_MODEL_TYPE, WEBHOOK_MENTION, WEBHOOK_SECRET
+from tools.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+job_queue = JobQueue()
+worker_pool = JobWorkerPool(job_queue)
+
+
+def verify_signature(body: bytes, signature: str) -> bool:
+    """Check the X-Hub-Signature-256 header GitHub computes with the webhook secret."""
+    if not WEBHOOK_SECRET or not signature:
+        return False
+    expected = "sha256=" + hmac.new(WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_mention(event: str, payload: dict):
+    """Return (owner, repo, issue_num, issue_url, branch) if the event mentions the app on an issue, else None."""
+    if event != "issue_comment" or payload.get("action") != "created":
+        return None
+    comment = payload.get("comment") or {}
+    if (payload.get("sender") or {}).get("type") == "Bot":
+        # Never react to comments posted by bots, including our own replies.
+        return None
+    if WEBHOOK_MENTION.lower() not in (comment.get("body") or "").lower():
+        return None
+
+    issue = payload.get("issue") or {}
+    repository = payload.get("repository") or {}
+    if issue.get("pull_request"):
+        # Comments on pull requests arrive as issue_comment events too; only issues are handled.
+        return None
+    if not issue.get("number") or not issue.get("html_url") or not (repository.get("owner") or {}).get("login") or not repository.get("name"):
+        return None
+    return (
+        repository["owner"]["login"],
+        repository["name"],
+        str(issue["number"]),
+        issue["html_url"],
+        repository.get("default_branch") or "main",
+    )
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    worker_pool.start()
+    yield
+    await worker_pool.stop()
+
+
+api = FastAPI(lifespan=lifespan)
+
+
+@api.post("/webhook")
+async def github_webhook(
+    request: Request,
+    x_github_event: str = Header(""),
+    x_github_delivery: str = Header(""),
+    x_hub_signature_256: str = Header(""),
+):
+    body = await request.body()
+    if not verify_signature(body, x_hub_signature_256):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    if not x_github_delivery:
+        # The delivery ID deduplicates jobs, so a missing one would collide with every other.
+        raise HTTPException(status_code=400, detail="Missing X-GitHub-Delivery header")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    mention = parse_mention(x_github_event, payload)
+    if mention is None:
+        return {"status": "ignored"}
+
+    owner, repo, issue_num, issue_url, branch = mention
+    job_id = await asyncio.to_thread(
+        job_queue.enqueue, x_github_delivery, owner, repo, issue_num, issue_url, branch, DEFAULT_MODEL_TYPE
+    )
+    if job_id is None:
+        logger.info("Skipping duplicate delivery %s for %s", x_github_delivery, issue_url)
+        return {"status": "duplicate"}
+
+    worker_pool.notify()
+    logger.info("Queued job %s for %s", job_id, issue_url)
+    return {"status": "queued", "job_id": job_id}
+
+
+@api.get("/webhook/status")
+async def webhook_status():
+    counts = await asyncio.to_thread(job_queue.counts)
+    return {"jobs": counts, "running_repos": dict(worker_pool.running_repos)}
+
+
+@api.get("/metrics")
+async def prometheus_metrics():
+    """Span counts, durations, tokens, bytes, cache hits and GitHub rate limit in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+api = gr.mount_gradio_app(api, demo, path="/")
+
+if __name__ == "__main__":
+    uvicorn.run(api, host="0.0.0.0", port=7860)